@@ -0,0 +1,94 @@
+"""
+Trip load, trip list and login query times as the tables grow, before and after
+the lookup indexes (migration 3 and the place table's trip_id/category index, see migrations.py).
+
+For every size the place table gets that many rows per category (20 places per category
+and trip, 5 trips per user). The queries are the ones DataManager runs: the places of
+a trip by trip_id, the trips of a user by user_id and the user by email on login.
+Run from the repository root:
+
+    python benchmarks/index_lookups.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine
+
+from data_manager import PLACE_MODELS
+from data_models import db
+from migrations import _003_lookup_indexes
+
+PLACES_PER_TRIP = 20
+TRIPS_PER_USER = 5
+
+
+def create_database(path, places):
+    """Current schema without the lookup indexes, i.e. a database before migration 3."""
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+    trips = max(1, places // PLACES_PER_TRIP)
+    users = max(1, trips // TRIPS_PER_USER)
+    conn = sqlite3.connect(path)
+    for (index,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'ix_%'").fetchall():
+        conn.execute(f"DROP INDEX {index}")
+    conn.executemany("INSERT INTO user (user_id, username, email, password) VALUES (?, ?, ?, 'x')",
+                     ((u, f"user{u}", f"user{u}@example.com") for u in range(users)))
+    conn.executemany("INSERT INTO trip (id, name, user_id, version) VALUES (?, ?, ?, 1)",
+                     ((f"trip-{t}", f"Trip {t}", t % users) for t in range(trips)))
+    for category in PLACE_MODELS:
+        conn.executemany("INSERT INTO place (category, name, coordinates, lat, lon, trip_id) "
+                         "VALUES (?, ?, '52.5, 13.4', 52.5, 13.4, ?)",
+                         ((category, f"Place {p}", f"trip-{random.randrange(trips)}") for p in range(places)))
+    conn.commit()
+    return conn, trips, users
+
+
+def time_ms(conn, queries, lookups):
+    start = time.perf_counter()
+    for sql, params in queries:
+        conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - start) * 1000 / lookups
+
+
+def measure(conn, trips, users, lookups):
+    trip_ids = [f"trip-{random.randrange(trips)}" for _ in range(lookups)]
+    user_ids = [random.randrange(users) for _ in range(lookups)]
+    trip_load = [("SELECT * FROM place WHERE trip_id = ? ORDER BY id", (trip_id,)) for trip_id in trip_ids]
+    trip_list = [("SELECT * FROM trip WHERE user_id = ?", (user_id,)) for user_id in user_ids]
+    login = [("SELECT * FROM user WHERE email = ?", (f"user{user_id}@example.com",)) for user_id in user_ids]
+    return time_ms(conn, trip_load, lookups), time_ms(conn, trip_list, lookups), time_ms(conn, login, lookups)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="places per category")
+    parser.add_argument("--lookups", type=int, default=50, help="operations timed per size")
+    args = parser.parse_args()
+
+    print(f"mean ms per operation over {args.lookups} lookups (trip load = the places of one trip)")
+    print(f"{'rows/cat.':>10} {'indexes':>8} {'trip load':>10} {'trip list':>10} {'login':>8}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn, trips, users = create_database(os.path.join(tmp, "bench.sqlite"), size)
+            before = measure(conn, trips, users, args.lookups)
+            _003_lookup_indexes(conn)
+            conn.execute("CREATE INDEX ix_place_trip_id_category ON place (trip_id, category)")
+            conn.commit()
+            after = measure(conn, trips, users, args.lookups)
+            conn.close()
+        for label, (trip_load, trip_list, login) in (("no", before), ("yes", after)):
+            print(f"{size:>10} {label:>8} {trip_load:>10.3f} {trip_list:>10.3f} {login:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
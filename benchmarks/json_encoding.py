@@ -0,0 +1,134 @@
+"""
+Time and memory to turn a trip with 500 places into a JSON response, the way
+GET /trips/<trip_id> and PUT /trips/<trip_id> do, before and after the fast path.
+
+- orm + stdlib: the trip and its places loaded as ORM objects, serialized with to_dict()
+  and encoded by Flask's default (stdlib json) provider
+- rows + stdlib: DataManager.load_trip, dicts built straight from the query rows
+- rows + orjson: the same with services/json_provider.py, orjson for the response and
+  for the JSON column (Place.day) of every row
+
+Load and encode are timed separately. Allocations are measured with tracemalloc: the peak
+traced memory of one request and the number of memory blocks it allocated that were
+still alive when the response was built.
+Run from the repository root:
+
+    python benchmarks/json_encoding.py --places 500 --repeat 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from data_manager import DataManager, PLACE_MODELS
+from data_models import db, User, Trip, Place
+from migrations import upgrade_database
+from services.json_provider import OrjsonProvider, json_engine_options, orjson
+
+TRIP_ID = "bench-trip"
+
+
+def create_app(path, engine_options=None, provider=DefaultJSONProvider):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options or {}
+    db.init_app(app)
+    app.json = provider(app)
+    return app
+
+
+def create_database(path, places):
+    app = create_app(path)
+    with app.app_context():
+        upgrade_database()
+        db.session.add(User(user_id=1, username="bench", email="bench@example.com", password="x"))
+        db.session.add(Trip(id=TRIP_ID, name="Bench trip", user_id=1))
+        models = list(PLACE_MODELS.values())
+        for i in range(places):
+            model = models[i % len(models)]
+            fields = {"price": "€€"} if hasattr(model, "price") else {}
+            db.session.add(model(trip_id=TRIP_ID, name=f"Place {i} – Café", coordinates=f"52.{i:04d}, 13.4",
+                                 address=f"Straße {i}, Berlin", day=[1 + i % 7], comments="Opens at 9, closes late",
+                                 external_url=f"https://example.com/places/{i}", **fields))
+        db.session.commit()
+        db.engine.dispose()
+
+
+def orm_payload(_data_manager):
+    trip = Trip.query.get(TRIP_ID)
+    places = {category: [] for category in PLACE_MODELS}
+    for place in Place.query.filter(Place.trip_id == TRIP_ID).order_by(Place.id).all():
+        places[place.category].append(place.to_dict())
+    return {"trip": trip.to_dict(), **places}
+
+
+def rows_payload(data_manager):
+    trip, places = data_manager.load_trip(TRIP_ID)
+    return {"trip": trip, **places}
+
+
+def measure(app, build_payload, repeat):
+    data_manager = DataManager()
+    with app.app_context():
+        body = app.json.response(build_payload(data_manager)).get_data()  # warm up compiled queries
+        db.session.remove()
+
+        load_s = encode_s = 0.0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            payload = build_payload(data_manager)
+            loaded = time.perf_counter()
+            app.json.response(payload).get_data()
+            load_s += loaded - start
+            encode_s += time.perf_counter() - loaded
+            db.session.remove()  # a new session per request, like Flask-SQLAlchemy does
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        payload = build_payload(data_manager)
+        response = app.json.response(payload)
+        after = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+        del payload, response
+        db.session.remove()
+        db.engine.dispose()
+    return load_s * 1000 / repeat, encode_s * 1000 / repeat, peak / 1024, blocks, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--places", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200, help="requests timed per variant")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite")
+        create_database(path, args.places)
+        variants = [
+            ("orm + stdlib", create_app(path), orm_payload),
+            ("rows + stdlib", create_app(path), rows_payload),
+        ]
+        if orjson is not None:
+            variants.append(("rows + orjson", create_app(path, json_engine_options(), OrjsonProvider), rows_payload))
+        else:
+            print("orjson is not installed, skipping the orjson variant")
+
+        print(f"trip with {args.places} places, mean ms of {args.repeat} requests")
+        print(f"{'variant':<14} {'load':>7} {'encode':>7} {'total':>7} {'peak KiB':>9} {'blocks':>7} {'bytes':>7}")
+        for label, app, build_payload in variants:
+            load_ms, encode_ms, peak_kib, blocks, size = measure(app, build_payload, args.repeat)
+            print(f"{label:<14} {load_ms:>7.2f} {encode_ms:>7.2f} {load_ms + encode_ms:>7.2f} "
+                  f"{peak_kib:>9.0f} {blocks:>7} {size:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Read/write throughput of the trip database with several concurrent worker processes,
+once per SQLite connection profile (see db_profile.py).
+
+Every worker process stands in for a gunicorn worker: 80% of its operations load a
+whole trip (all its places), 20% save a trip the way PUT /trips/<trip_id> does
+(insert a place and rename the trip in one transaction, which also fires the version
+and R-tree triggers). Run from the repository root:
+
+    python benchmarks/sqlite_concurrency.py --workers 8 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from data_manager import PLACE_MODELS
+from data_models import db
+from db_profile import PROFILES, engine_options, install_profile
+from migrations import upgrade_database
+
+TRIPS = 200
+PLACES_PER_CATEGORY = 10
+WRITE_RATIO = 0.2
+
+
+def create_database(path, profile):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(profile)
+    db.init_app(app)
+    with app.app_context():
+        install_profile(db.engine, profile)
+        upgrade_database()
+        with db.engine.begin() as conn:
+            conn.execute(text("INSERT INTO user (username, email, password) VALUES ('bench', 'b@x', 'x')"))
+            for trip in range(TRIPS):
+                conn.execute(text("INSERT INTO trip (id, name, user_id) VALUES (:id, :name, 1)"),
+                             {"id": f"trip-{trip}", "name": f"Trip {trip}"})
+                for category in PLACE_MODELS:
+                    conn.execute(text("INSERT INTO place (category, name, coordinates, lat, lon, trip_id) "
+                                      "VALUES (:category, :name, '52.5, 13.4', 52.5, 13.4, :trip_id)"),
+                                 [{"category": category, "name": f"Place {i}", "trip_id": f"trip-{trip}"}
+                                  for i in range(PLACES_PER_CATEGORY)])
+        db.engine.dispose()
+
+
+def worker(path, profile, seconds, results):
+    engine = create_engine(f"sqlite:///{path}", **engine_options(profile))
+    install_profile(engine, profile)
+    reads = writes = errors = 0
+    rng = random.Random(os.getpid())
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        trip_id = f"trip-{rng.randrange(TRIPS)}"
+        try:
+            if rng.random() < WRITE_RATIO:
+                with engine.begin() as conn:
+                    conn.execute(text("SELECT version FROM trip WHERE id = :id"), {"id": trip_id})
+                    conn.execute(text("INSERT INTO place (category, name, coordinates, lat, lon, trip_id) "
+                                      "VALUES ('explore', 'New', '52.5, 13.4', 52.5, 13.4, :id)"), {"id": trip_id})
+                    conn.execute(text("UPDATE trip SET name = :name WHERE id = :id"),
+                                 {"name": f"Renamed {rng.random()}", "id": trip_id})
+                writes += 1
+            else:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT * FROM place WHERE trip_id = :id ORDER BY id"), {"id": trip_id}).fetchall()
+                reads += 1
+        except OperationalError:  # "database is locked"
+            errors += 1
+    engine.dispose()
+    results.put((reads, writes, errors))
+
+
+def run(profile, workers, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite")
+        create_database(path, profile)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=worker, args=(path, profile, seconds, results))
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        totals = [sum(values) for values in zip(*(results.get() for _ in processes))]
+        for process in processes:
+            process.join()
+    reads, writes, errors = totals
+    return reads / seconds, writes / seconds, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers, {args.seconds:g} s per profile, {int(WRITE_RATIO * 100)}% writes")
+    print(f"{'profile':<12} {'reads/s':>10} {'writes/s':>10} {'locked errors':>14}")
+    for profile in args.profiles:
+        reads, writes, errors = run(profile, args.workers, args.seconds)
+        print(f"{profile:<12} {reads:>10.0f} {writes:>10.0f} {errors:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,55 @@
+from sqlalchemy import select, text
 from sqlalchemy.exc import SQLAlchemyError
+import math
 import uuid
 from datetime import date
-from data_models import db, User, Trip, Stay, Explore, EatDrink, Essentials, GettingAround
+from operator import itemgetter
+from data_models import db, User, Trip, Place, PlaceTombstone, Stay, Explore, EatDrink, Essentials, GettingAround
+from services.geo import haversine_m
+from services.identity_cache import identity_cache
+
+# Place models of a trip, keyed by the name used in the API payloads, which is also
+# their category in the place table
+PLACE_MODELS = {
+    "explore": Explore,
+    "stays": Stay,
+    "eat_drink": EatDrink,
+    "essentials": Essentials,
+    "getting_around": GettingAround,
+}
+# Keys of the to_dict() of each place model
+PLACE_DICT_FIELDS = {category: list(model.dict_fields) for category, model in PLACE_MODELS.items()}
+# Columns of each place model that the frontend edits (lat/lon are derived from coordinates)
+PLACE_FIELDS = {
+    category: [name for name in fields if name not in ("id", "trip_id", "lat", "lon")]
+    for category, fields in PLACE_DICT_FIELDS.items()
+}
+# Keys of Trip.to_dict()
+TRIP_FIELDS = ("id", "name", "user_id", "date", "version")
+# Columns load_trip selects: the category, then every column some place model serializes
+TRIP_PLACE_COLUMNS = ("category",) + tuple(dict.fromkeys(
+    name for fields in PLACE_DICT_FIELDS.values() for name in fields))
+# Per category, picks that model's to_dict() values out of a TRIP_PLACE_COLUMNS row
+_PLACE_ROW_VALUES = {
+    category: itemgetter(*(TRIP_PLACE_COLUMNS.index(name) for name in fields))
+    for category, fields in PLACE_DICT_FIELDS.items()
+}
+
+
+# Row serializers: dicts shaped like the models' to_dict(), built from the columns of a query
+# row without loading ORM objects (no identity map, no instrumented attributes per row)
+
+def row_to_dict(row, fields, offset=0):
+    """Dict of a row that selected exactly `fields`, starting at column `offset`."""
+    return dict(zip(fields, row[offset:]))
+
+
+def trip_row_to_dict(row, fields=TRIP_FIELDS, offset=0):
+    """Like Trip.to_dict(), from a row that selected `fields` of the trip table."""
+    trip = dict(zip(fields, row[offset:]))
+    if trip.get("date"):
+        trip["date"] = trip["date"].isoformat()
+    return trip
 
 
 class DataManager():
@@ -70,6 +118,32 @@ class DataManager():
             return None
 
 
+    def get_identity(self, user_id):
+        """Retrieve the identity behind a JWT, from the identity cache when it was seen recently.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            dict: user_id, username, email and role of the user if found.
+            None: If the user does not exist or an error occurred.
+        """
+        identity = identity_cache.get(user_id)
+        if identity is not None:
+            return identity
+        try:
+            row = db.session.execute(
+                select(User.user_id, User.username, User.email, User.role).where(User.user_id == user_id)).first()
+        except SQLAlchemyError as e:
+            print("A database error occurred:", str(e))
+            return None
+        if row is None:
+            return None
+        identity = dict(row._mapping)
+        identity_cache.set(user_id, identity)
+        return identity
+
+
     def update_user(self, user_id, username, email, password, ):
         """Update an existing user.
 
@@ -94,6 +168,7 @@ class DataManager():
             user.password = password
         try:
             db.session.commit()
+            identity_cache.delete(user.user_id)
             return user
         except Exception as e:
             db.session.rollback()
@@ -101,6 +176,33 @@ class DataManager():
             return None
 
 
+    def set_user_role(self, email, role):
+        """Set the role of the user with the given email.
+
+        Args:
+            email (str): Email of the user.
+            role (str): "admin" or "user".
+
+        Returns:
+            User: The updated user object if successful.
+            None: If no user or more than one user (databases from before the unique email index)
+                has that email, or an error occurred.
+        """
+        users = User.query.filter_by(email=email).all()
+        if len(users) != 1:
+            return None
+        user = users[0]
+        user.role = role
+        try:
+            db.session.commit()
+            identity_cache.delete(user.user_id)
+            return user
+        except Exception as e:
+            db.session.rollback()
+            print("An error has occurred while setting the user role: ", str(e))
+            return None
+
+
     def delete_user(self, user_id):
         """
         Deletes a user from the database by their user ID.
@@ -114,6 +216,7 @@ class DataManager():
         try:
             user_deleted = User.query.filter(User.user_id == user_id).delete()
             db.session.commit()
+            identity_cache.delete(int(user_id))
             return user_deleted > 0 # returns True if a user was deleted
         except Exception as e:
             db.session.rollback()
@@ -166,6 +269,83 @@ class DataManager():
             return None
 
 
+    def _keyset_page(self, model, key, fields, conditions, after, limit):
+        """Select only the given columns of the rows matching conditions, ordered by key,
+        starting after the key `after` and at most `limit` rows (all rows without a limit).
+
+        Returns:
+            tuple: (rows, next_after) where next_after is the key of the last row
+                when there are more rows, else None.
+        """
+        query = select(key.label("page_key"), *(getattr(model, name) for name in fields)).where(*conditions)
+        if after is not None:
+            query = query.where(key > after)
+        query = query.order_by(key)
+        if limit:
+            query = query.limit(limit + 1)  # one more row tells whether there is a next page
+        rows = db.session.execute(query).all()
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            return rows, rows[-1].page_key
+        return rows, None
+
+
+    def list_trips(self, user_id, fields=TRIP_FIELDS, after=None, limit=None):
+        """Retrieve one page of a user's trips in creation order, with only the requested columns.
+
+        Args:
+            user_id (int): The ID of the user.
+            fields (list[str]): Keys of Trip.to_dict() to load.
+            after (int): Continue after this trip (the key returned with the previous page).
+            limit (int): Page size, None for all trips.
+
+        Returns:
+            tuple: (trips, next_after) where trips is a list of dicts shaped like Trip.to_dict()
+                restricted to fields, and next_after the key of the next page or None.
+            None: If an error occurred.
+        """
+        try:
+            rows, next_after = self._keyset_page(Trip, Trip.created_seq, fields, [Trip.user_id == user_id],
+                                                 after, limit)
+            return [trip_row_to_dict(row, fields, offset=1) for row in rows], next_after
+        except SQLAlchemyError as e:
+            print("A database error occurred: ", str(e))
+            return None
+        except Exception as e:
+            print("An unexpected error occurred:", str(e))
+            return None
+
+
+    def list_places(self, category, trip_id, fields=None, after=None, limit=None):
+        """Retrieve one page of the places of a trip in one category, ordered by id,
+        with only the requested columns.
+
+        Args:
+            category (str): A key of PLACE_MODELS ("explore", "stays", ...).
+            trip_id (str): The ID of the trip.
+            fields (list[str]): Keys of the model's to_dict() to load, all of them when None.
+            after (int): Continue after this place id.
+            limit (int): Page size, None for all places.
+
+        Returns:
+            tuple: (places, next_after) where places is a list of dicts shaped like the
+                model's to_dict() restricted to fields, and next_after the id to continue after or None.
+            None: If an error occurred.
+        """
+        model = PLACE_MODELS[category]
+        fields = fields or PLACE_DICT_FIELDS[category]
+        try:
+            conditions = [Place.trip_id == trip_id, Place.category == category]
+            rows, next_after = self._keyset_page(model, model.id, fields, conditions, after, limit)
+            return [row_to_dict(row, fields, offset=1) for row in rows], next_after
+        except SQLAlchemyError as e:
+            print("A database error occurred:", str(e))
+            return None
+        except Exception as e:
+            print("An unexpected error occurred:", str(e))
+            return None
+
+
     def open_trip(self, trip_id):
         """Retrieve a single trip by its ID.
 
@@ -186,6 +366,23 @@ class DataManager():
             return None
 
 
+    def get_trip_version(self, trip_id):
+        """Retrieve only the version of a trip, a single indexed lookup used for ETags.
+
+        Args:
+            trip_id (str): The ID of the trip.
+
+        Returns:
+            int: The current version of the trip.
+            None: If the trip does not exist or an error occurred.
+        """
+        try:
+            return db.session.query(Trip.version).filter(Trip.id == trip_id).scalar()
+        except SQLAlchemyError as e:
+            print("A database error occurred:", str(e))
+            return None
+
+
     def update_trip(self, trip_id, name, date_str=None):
         """Update an existing trip's name.
 
@@ -216,9 +413,71 @@ class DataManager():
             return None
 
 
+    def apply_trip_changes(self, trip_id, name, date_str, changes):
+        """Apply a whole trip form (trip details plus added, edited and deleted places)
+        in a single transaction.
+
+        Referenced rows are fetched with one IN query per place table and everything is
+        committed once, so either the whole change set is saved or nothing is.
+
+        Args:
+            trip_id (str): The ID of the trip to update.
+            name (str): New trip name, kept when empty.
+            date_str (str): New trip date in ISO format, or None to clear it.
+            changes (dict): Lists of place rows keyed like PLACE_MODELS ("explore", "stays", ...).
+                Rows with "deleted" are removed, rows with an "id" updated, the others added.
+
+        Returns:
+            Trip: The updated trip object if successful.
+            None: If the trip is not found or an error occurred.
+
+        Raises:
+            ValueError: If the date or a place id is malformed, before anything is written.
+        """
+        event_date = date.fromisoformat(date_str) if date_str else None
+        for category in PLACE_MODELS:
+            for row in changes.get(category) or []:
+                if row.get("id") and not str(row["id"]).isdigit():
+                    raise ValueError(f"Invalid {category} id: {row['id']}")
+
+        trip = Trip.query.get(trip_id)
+        if not trip:
+            return None
+        try:
+            if name:
+                trip.name = name
+            trip.date = event_date
+
+            for category, model in PLACE_MODELS.items():
+                rows = changes.get(category) or []
+                fields = PLACE_FIELDS[category]
+                deleted_ids = {int(row["id"]) for row in rows if row.get("deleted") and row.get("id")}
+                updated_rows = {int(row["id"]): row for row in rows if not row.get("deleted") and row.get("id")}
+                new_rows = [row for row in rows if not row.get("deleted") and not row.get("id")]
+
+                if deleted_ids:
+                    model.query.filter(model.trip_id == trip_id, model.category == category,
+                                       model.id.in_(deleted_ids)).delete(synchronize_session=False)
+                if updated_rows:
+                    places = model.query.filter(model.trip_id == trip_id, model.id.in_(updated_rows)).all()
+                    for place in places:
+                        row = updated_rows[place.id]
+                        for field in fields:
+                            setattr(place, field, row.get(field))
+                db.session.add_all([model(trip_id=trip_id, **{field: row.get(field) for field in fields})
+                                    for row in new_rows])
+
+            db.session.commit()
+            return trip
+        except Exception as e:
+            db.session.rollback()
+            print("An error has occurred while saving trip changes: ", str(e))
+            return None
+
+
     def delete_trip(self, trip_id):
         """
-        Deletes a trip from the database by its ID.
+        Deletes a trip and its places from the database by its ID, in one transaction.
 
         Args:
             trip_id (int): The unique identifier of the trip to delete.
@@ -227,7 +486,9 @@ class DataManager():
             bool: True if a trip was successfully deleted, False otherwise.
         """
         try:
+            Place.query.filter(Place.trip_id == trip_id).delete()
             trip_deleted = Trip.query.filter(Trip.id == trip_id).delete()
+            PlaceTombstone.query.filter(PlaceTombstone.trip_id == trip_id).delete()
             db.session.commit()
             return trip_deleted > 0 # returns True if a user was deleted
         except Exception as e:
@@ -236,20 +497,26 @@ class DataManager():
             return False
 
 
-    # EXPLORE FUNCTIONS
-    # Shouldn't they be added/updated all at once everytime instead of one at a time?
-    # Should there be a delete option or just update?
+    def load_trip(self, trip_id):
+        """Retrieve a trip together with all its places in two queries:
+        the trip row and one indexed scan of the place table.
+        Both are serialized straight from the rows, no ORM objects are built.
 
-    def get_explore(self):
-        """Retrieve all places to explore from the database.
+        Args:
+            trip_id (str): The ID of the trip.
 
         Returns:
-            list[Explore]: A list of Explore objects.
-            None: If an error occurred.
+            tuple: (trip, places) where trip is a dict shaped like Trip.to_dict() and places
+                maps every key of PLACE_MODELS ("explore", "stays", ...) to a list of dicts
+                shaped like the to_dict() of that model, ordered by id.
+            None: If the trip does not exist or an error occurred.
         """
         try:
-            explore = Explore.query.all()
-            return explore
+            row = db.session.execute(
+                select(*(getattr(Trip, name) for name in TRIP_FIELDS)).where(Trip.id == trip_id)).first()
+            if row is None:
+                return None
+            return trip_row_to_dict(row), self._trip_places(trip_id)
         except SQLAlchemyError as e:
             print("A database error occurred:", str(e))
             return None
@@ -258,16 +525,57 @@ class DataManager():
             return None
 
 
-    def get_explore_by_trip(self, trip_id):
-        """Retrieve all places to explore from a specific trip in the database.
+    def _trip_places(self, trip_id, since=None):
+        """The places of a trip serialized straight from the rows, grouped by category and ordered by id.
+        With `since`, only the places created or changed after that trip version."""
+        columns = (Place.__table__.c[name] for name in TRIP_PLACE_COLUMNS)
+        query = select(*columns).where(Place.trip_id == trip_id)
+        if since is not None:
+            query = query.where(Place.version > since)
+        rows = db.session.execute(query.order_by(Place.id)).all()
 
-        Returns:
-            list[Explore]: A list of explore objects.
-            None: If an error occurred.
-        """
-        try:
-            explore = Explore.query.filter_by(trip_id=trip_id).all()
-            return explore
+        places = {category: [] for category in PLACE_MODELS}
+        for row in rows:
+            category = row[0]
+            places[category].append(dict(zip(PLACE_DICT_FIELDS[category], _PLACE_ROW_VALUES[category](row))))
+        return places
+
+
+    def get_trip_changes(self, trip_id, since):
+        """Retrieve what changed in a trip after the version a client has.
+
+        Args:
+            trip_id (str): The ID of the trip.
+            since (int): The trip version the client last loaded.
+
+        Returns:
+            dict: "trip" (like Trip.to_dict(), its version is the client's next `since`), the created
+                or changed places keyed like PLACE_MODELS ("explore", "stays", ...) as in load_trip,
+                and "deleted", the ids of the removed places per category. When `since` is older
+                than the trip's change tracking (or newer than the trip), every place is returned
+                with "full": True and the client replaces its copy.
+            None: If the trip does not exist or an error occurred.
+        """
+        try:
+            row = db.session.execute(
+                select(*(getattr(Trip, name) for name in TRIP_FIELDS), Trip.tracked_since)
+                .where(Trip.id == trip_id)).first()
+            if row is None:
+                return None
+            trip = trip_row_to_dict(row)
+            full = not row.tracked_since <= since <= trip["version"]
+
+            deleted = {category: [] for category in PLACE_MODELS}
+            if not full:
+                tombstones = db.session.execute(
+                    select(PlaceTombstone.category, PlaceTombstone.place_id)
+                    .where(PlaceTombstone.trip_id == trip_id, PlaceTombstone.version > since)
+                    .order_by(PlaceTombstone.version)).all()
+                for category, place_id in tombstones:
+                    deleted[category].append(place_id)
+
+            places = self._trip_places(trip_id, since=None if full else since)
+            return {"trip": trip, "full": full, **places, "deleted": deleted}
         except SQLAlchemyError as e:
             print("A database error occurred:", str(e))
             return None
@@ -276,126 +584,83 @@ class DataManager():
             return None
 
 
-    def add_explore(self, trip_id, name, coordinates, address, day, price, comments, external_url):
-        """Create and save a new place to explore to the database.
+    def get_places_in_bbox(self, south, west, north, east, trip_id=None, user_id=None):
+        """Retrieve the places inside a bounding box with the place_index R-tree.
 
         Args:
-            name (str): The name of the place to explore.
-            coordinates (str): The latitude and longitude of the place to explore.
-            address (str): The address of the place to explore.
-            day (array): The day(s) on which this point will be used during the trip.
-            price (str): The price of the place to explore (e.g. entry fee).
-            comments (str): Any comments pertaining that place to explore.
-            external_url (str): Link to related website (e.g. buy tickets).
+            south, west, north, east (float): The bounding box in degrees.
+            trip_id (str): Only places of this trip, if given.
+            user_id (int): Only places of this user's trips, if given.
 
         Returns:
-            Explore: The newly created place to explore object if successful.
+            list[dict]: The places as to_dict() plus their "category" ("explore", "stays", ...).
             None: If an error occurred.
         """
-        new_explore = Explore(
-            trip_id=trip_id,
-            name=name,
-            coordinates=coordinates,
-            address=address,
-            day=day,
-            price=price,
-            comments=comments,
-            external_url=external_url)
-        try:
-            db.session.add(new_explore)
-            db.session.commit()
-            return new_explore
-        except Exception as e:
-            db.session.rollback()
-            print("An error has occurred while creating place to explore: ", str(e))
-
-
-    def update_explore(self, explore_id, name, coordinates, address, day, price, comments, external_url):
-        """Update an existing place to explore details.
-
-        Args:
-            explore_id (int): The ID of the explore place to update.
-            name (str): New explore place name to update.
-            coordinates (str): New latitude and longitude to update.
-            address (str): New explore address to update.
-            day (array): The day(s) on which this point will be used during the trip.
-            price (str): New explore price to update.
-            comments (str): New comment to update.
-            external_url (str): New external link to update.
-
-        Returns:
-            Explore: The updated place to explore object if successful.
-            None: If the explore place is not found or an error occurred.
-        """
-        explore = Explore.query.get(explore_id)
-        if not explore:
-            return None
-        explore.name = name
-        explore.coordinates = coordinates
-        explore.address = address
-        explore.day = day
-        explore.price = price
-        explore.comments = comments
-        explore.external_url = external_url
-        try:
-            db.session.commit()
-            return explore
-        except Exception as e:
-            db.session.rollback()
-            print("An error has occurred while updating place to explore: ", str(e))
+        sql = ("SELECT place_index.id FROM place_index "
+               "WHERE min_lat <= :north AND max_lat >= :south AND min_lon <= :east AND max_lon >= :west")
+        params = {"south": south, "west": west, "north": north, "east": east}
+        if trip_id is not None:
+            sql += " AND trip_id = :trip_id"
+            params["trip_id"] = trip_id
+        if user_id is not None:
+            sql += " AND trip_id IN (SELECT id FROM trip WHERE user_id = :user_id)"
+            params["user_id"] = user_id
+        try:
+            ids = db.session.execute(text(sql), params).scalars().all()
+
+            places = []
+            # loads each row as the model of its category
+            for place in Place.query.filter(Place.id.in_(ids)).order_by(Place.id).all():
+                # the R-tree stores 32 bit floats, check the exact values
+                if south <= place.lat <= north and west <= place.lon <= east:
+                    places.append({**place.to_dict(), "category": place.category})
+            return places
+        except SQLAlchemyError as e:
+            print("A database error occurred:", str(e))
             return None
 
 
-    def delete_explore(self, explore_id):
-        """
-        Deletes a place to explore from the database by its ID.
-
-        Args:
-            explore_id (int): The unique identifier of the explore place to delete.
+    def get_places_near(self, lat, lon, radius, trip_id=None, user_id=None):
+        """Retrieve the places within `radius` metres of a point, nearest first.
 
         Returns:
-            bool: True if an explore was successfully deleted, False otherwise.
-        """
-        try:
-            explore_deleted = Explore.query.filter(Explore.id == explore_id).delete()
-            db.session.commit()
-            return explore_deleted > 0 # returns True if an item was deleted
-        except Exception as e:
-            db.session.rollback()
-            print("An error has occurred while deleting place to explore: ", str(e))
-            return False
-
-
-    # STAY FUNCTIONS
-
-    def get_stays(self):
-        """Retrieve all stays from the database.
-
-        Returns:
-            list[Stay]: A list of Stay objects.
+            list[dict]: The places as to_dict() plus "category" and "distance" in metres.
             None: If an error occurred.
         """
-        try:
-            stays = Stay.query.all()
-            return stays
-        except SQLAlchemyError as e:
-            print("A database error occurred:", str(e))
-            return None
-        except Exception as e:
-            print("An unexpected error occurred:", str(e))
+        d_lat = radius / 111320.0
+        d_lon = radius / (111320.0 * max(math.cos(math.radians(lat)), 0.01))
+        places = self.get_places_in_bbox(lat - d_lat, lon - d_lon, lat + d_lat, lon + d_lon, trip_id, user_id)
+        if places is None:
             return None
+        nearby = []
+        for place in places:
+            distance = haversine_m(lat, lon, place["lat"], place["lon"])
+            if distance <= radius:
+                nearby.append({**place, "distance": round(distance, 1)})
+        return sorted(nearby, key=lambda place: place["distance"])
 
 
-    def get_stays_by_trip(self, trip_id):
-        """Retrieve all stays from a specific trip in the database.
+    # PLACE FUNCTIONS
+    # Every category (explore, stays, ...) is a model over the one place table, see PLACE_MODELS.
+    # The per-category methods below keep the API the routes and scripts have always used.
+
+    def get_places(self, category, trip_id=None):
+        """Retrieve the places of one category, of every trip or of a single trip.
+
+        Args:
+            category (str): A key of PLACE_MODELS ("explore", "stays", ...).
+            trip_id (str): Only the places of this trip, if given.
 
         Returns:
-            list[Stay]: A list of stay objects.
+            list[Place]: A list of objects of the category's model, ordered by id.
             None: If an error occurred.
         """
+        model = PLACE_MODELS[category]
         try:
-            stays = Stay.query.filter_by(trip_id=trip_id).all()
-            return stays
+            query = model.query
+            if trip_id is not None:
+                query = query.filter(model.trip_id == trip_id)
+            return query.order_by(model.id).all()
         except SQLAlchemyError as e:
             print("A database error occurred:", str(e))
             return None
@@ -404,470 +669,210 @@ class DataManager():
             return None
 
 
-    def add_stay(self, trip_id, name, coordinates, address, day, price, status, comments, external_url):
-        """Create and save new stay to the database.
+    def add_place(self, category, trip_id, **fields):
+        """Create and save a new place to the database.
 
         Args:
-            name (str): The name of the stay (e.g. hotel..., camping...).
-            coordinates (str): The latitude and longitude of the stay.
-            address (str): The address of the stay.
-            price (str): The price of the stay.
-            day (array): The day(s) on which this point will be used during the trip.
-            status (str): The status of the stay (e.g. paid, reserved).
-            comments (str): Any comments pertaining that stay.
-            external_url (str): Link to related website (e.g. reservation confirmation).
+            category (str): A key of PLACE_MODELS ("explore", "stays", ...).
+            trip_id (str): The ID of the trip the place belongs to.
+            **fields: The place's columns, any of PLACE_FIELDS[category] (name, coordinates,
+                address, day, price, status, comments, external_url).
 
         Returns:
-            Stay: The newly created stay object if successful.
+            Place: The newly created object of the category's model if successful.
             None: If an error occurred.
         """
-        new_stay = Stay(
-            trip_id=trip_id,
-            name=name,
-            coordinates=coordinates,
-            address=address,
-            day=day,
-            price=price,
-            status=status,
-            comments=comments,
-            external_url=external_url)
+        new_place = PLACE_MODELS[category](trip_id=trip_id, **fields)
         try:
-            db.session.add(new_stay)
+            db.session.add(new_place)
             db.session.commit()
-            return new_stay
+            return new_place
         except Exception as e:
             db.session.rollback()
-            print("An error has occurred while creating stay: ", str(e))
+            print(f"An error has occurred while creating {category} place: ", str(e))
+            return None
 
 
-    def update_stay(self, stay_id, name, coordinates, address, day, price, status, comments, external_url):
-        """Update an existing stay's details.
+    def update_place(self, category, place_id, **fields):
+        """Update an existing place's details.
 
         Args:
-            stay_id (int): The ID of the stay to update.
-            name (str): New stay type to update.
-            coordinates (str): New latitude and longitude to update.
-            address (str): New address to update.
-            day (array): The day(s) on which this point will be used during the trip.
-            price (str): New price to update.
-            status (str): New status to update
-            comments (str): New comment to update.
-            external_url (str): New external link to update.
+            category (str): A key of PLACE_MODELS ("explore", "stays", ...).
+            place_id (int): The ID of the place to update.
+            **fields: The new values of the place's columns.
 
         Returns:
-            Stay: The updated stay object if successful.
-            None: If the stay is not found or an error occurred.
+            Place: The updated object if successful.
+            None: If the place is not found or an error occurred.
         """
-        stay = Stay.query.get(stay_id)
-        if not stay:
-            return None
-        stay.name = name
-        stay.coordinates = coordinates
-        stay.address = address
-        stay.day = day
-        stay.price = price
-        stay.status = status
-        stay.comments = comments
-        stay.external_url = external_url
+        model = PLACE_MODELS[category]
+        place = model.query.filter(model.id == place_id).first()
+        if not place:
+            return None
+        for field, value in fields.items():
+            setattr(place, field, value)
         try:
             db.session.commit()
-            return stay
+            return place
         except Exception as e:
             db.session.rollback()
-            print("An error has occurred while updating stay: ", str(e))
+            print(f"An error has occurred while updating {category} place: ", str(e))
             return None
 
 
-    def delete_stay(self, stay_id):
+    def delete_place(self, category, place_id):
         """
-        Deletes stay from the database by its ID.
+        Deletes a place from the database by its ID.
 
         Args:
-            stay_id (int): The unique identifier of the stay to delete.
+            category (str): A key of PLACE_MODELS ("explore", "stays", ...).
+            place_id (int): The unique identifier of the place to delete.
 
         Returns:
-            bool: True if a stay object was successfully deleted, False otherwise.
+            bool: True if a place was successfully deleted, False otherwise.
         """
+        model = PLACE_MODELS[category]
         try:
-            stay_deleted = Stay.query.filter(Stay.id == stay_id).delete()
+            place_deleted = model.query.filter(model.category == category, model.id == place_id) \
+                .delete(synchronize_session=False)
             db.session.commit()
-            return stay_deleted > 0 # returns True if an item was deleted
+            return place_deleted > 0  # returns True if an item was deleted
         except Exception as e:
             db.session.rollback()
-            print("An error has occurred while deleting stay: ", str(e))
+            print(f"An error has occurred while deleting {category} place: ", str(e))
             return False
 
 
-    # EAT&DRINK FUNCTIONS
+    # EXPLORE FUNCTIONS
 
-    def get_eat_drink(self):
-        """Retrieve all eat&drink objects from the database.
+    def get_explore(self):
+        """Retrieve all places to explore from the database."""
+        return self.get_places("explore")
 
-        Returns:
-            list[EatDrink]: A list of eat&drink objects.
-            None: If an error occurred.
-        """
-        try:
-            eat_drink = EatDrink.query.all()
-            return eat_drink
-        except SQLAlchemyError as e:
-            print("A database error occurred:", str(e))
-            return None
-        except Exception as e:
-            print("An unexpected error occurred:", str(e))
-            return None
 
+    def get_explore_by_trip(self, trip_id):
+        """Retrieve all places to explore from a specific trip in the database."""
+        return self.get_places("explore", trip_id)
 
-    def get_eat_drink_by_trip(self, trip_id):
-        """Retrieve all eat&drink from a specific trip in the database.
 
-        Returns:
-            list[EatDrink]: A list of eat&drink objects.
-            None: If an error occurred.
-        """
-        try:
-            eat_drink = EatDrink.query.filter_by(trip_id=trip_id).all()
-            return eat_drink
-        except SQLAlchemyError as e:
-            print("A database error occurred:", str(e))
-            return None
-        except Exception as e:
-            print("An unexpected error occurred:", str(e))
-            return None
+    def add_explore(self, trip_id, name, coordinates, address, day, price, comments, external_url):
+        """Create and save a new place to explore to the database."""
+        return self.add_place("explore", trip_id, name=name, coordinates=coordinates, address=address, day=day, price=price, comments=comments, external_url=external_url)
 
 
-    def add_eat_drink(self, trip_id, name, coordinates, address, day, comments, external_url):
-        """Create and save new eat&drink to the database.
+    def update_explore(self, explore_id, name, coordinates, address, day, price, comments, external_url):
+        """Update an existing place to explore's details."""
+        return self.update_place("explore", explore_id, name=name, coordinates=coordinates, address=address, day=day, price=price, comments=comments, external_url=external_url)
 
-        Args:
-            name (str): The name of eat&drink place.
-            coordinates(str): The latitude and longitude of the eat&drink place.
-            address (str): The address of the eat&drink place.
-            day (array): The day(s) on which this point will be used during the trip.
-            comments (str): Any comments pertaining that place.
-            external_url (str): Link to related website (e.g. restaurant's menu).
 
-        Returns:
-            EatDrink: The newly created eat&drink object if successful.
-            None: If an error occurred.
-        """
-        new_eat_drink = EatDrink(
-            trip_id=trip_id,
-            name=name,
-            coordinates=coordinates,
-            address=address,
-            day=day,
-            comments=comments,
-            external_url=external_url)
-        try:
-            db.session.add(new_eat_drink)
-            db.session.commit()
-            return new_eat_drink
-        except Exception as e:
-            db.session.rollback()
-            print("An error has occurred while creating eat&drink place: ", str(e))
+    def delete_explore(self, explore_id):
+        """Deletes a place to explore from the database by its ID."""
+        return self.delete_place("explore", explore_id)
 
 
-    def update_eat_drink(self, eat_drink_id, name, coordinates, address, day, comments, external_url):
-        """Update an existing eat&drink's details.
+    # STAY FUNCTIONS
 
-        Args:
-            eat_drink_id (int): The ID of the eat&drink place to update.
-            name (str): New eat&drink name to update.
-            coordinates (str): New latitude and longitude to update.
-            address (str): New address to update.
-            day (array): The day(s) on which this point will be used during the trip.
-            comments (str): New comment to update.
-            external_url (str): New external link to update.
+    def get_stays(self):
+        """Retrieve all stays from the database."""
+        return self.get_places("stays")
 
-        Returns:
-            EatDrink: The updated eat&drink object if successful.
-            None: If the eat&drink object is not found or an error occurred.
-        """
-        eat_drink = EatDrink.query.get(eat_drink_id)
-        if not eat_drink:
-            return None
-        eat_drink.name = name
-        eat_drink.coordinates = coordinates
-        eat_drink.address = address
-        eat_drink.day = day
-        eat_drink.comments = comments
-        eat_drink.external_url = external_url
-        try:
-            db.session.commit()
-            return eat_drink
-        except Exception as e:
-            db.session.rollback()
-            print("An error has occurred while updating eat&drink place: ", str(e))
-            return None
 
+    def get_stays_by_trip(self, trip_id):
+        """Retrieve all stays from a specific trip in the database."""
+        return self.get_places("stays", trip_id)
 
-    def delete_eat_drink(self, eat_drink_id):
-        """
-        Deletes eat&drink from the database by its ID.
 
-        Args:
-            eat_drink_id (int): The unique identifier of the eat&drink to delete.
+    def add_stay(self, trip_id, name, coordinates, address, day, price, status, comments, external_url):
+        """Create and save a new stay to the database."""
+        return self.add_place("stays", trip_id, name=name, coordinates=coordinates, address=address, day=day, price=price, status=status, comments=comments, external_url=external_url)
 
-        Returns:
-            bool: True if an eat&drink object was successfully deleted, False otherwise.
-        """
-        try:
-            eat_drink_deleted = EatDrink.query.filter(
-                EatDrink.id == eat_drink_id).delete()
-            db.session.commit()
-            return eat_drink_deleted > 0  # returns True if an item was deleted
-        except Exception as e:
-            db.session.rollback()
-            print("An error has occurred while deleting eat&drink: ", str(e))
-            return False
 
+    def update_stay(self, stay_id, name, coordinates, address, day, price, status, comments, external_url):
+        """Update an existing stay's details."""
+        return self.update_place("stays", stay_id, name=name, coordinates=coordinates, address=address, day=day, price=price, status=status, comments=comments, external_url=external_url)
 
-# ESSENTIALS FUNCTIONS
 
-    def get_essentials(self):
-        """Retrieve all essentials objects from the database.
+    def delete_stay(self, stay_id):
+        """Deletes a stay from the database by its ID."""
+        return self.delete_place("stays", stay_id)
 
-        Returns:
-            list[Essentials]: A list of essentials objects.
-            None: If an error occurred.
-        """
-        try:
-            essentials = Essentials.query.all()
-            return essentials
-        except SQLAlchemyError as e:
-            print("A database error occurred:", str(e))
-            return None
-        except Exception as e:
-            print("An unexpected error occurred:", str(e))
-            return None
 
+    # EAT&DRINK FUNCTIONS
 
-    def get_essentials_by_trip(self, trip_id):
-        """Retrieve all essentials from a specific trip in the database.
+    def get_eat_drink(self):
+        """Retrieve all eat&drink places from the database."""
+        return self.get_places("eat_drink")
 
-        Returns:
-            list[Essentials]: A list of essentials objects.
-            None: If an error occurred.
-        """
-        try:
-            essentials = Essentials.query.filter_by(trip_id=trip_id).all()
-            return essentials
-        except SQLAlchemyError as e:
-            print("A database error occurred:", str(e))
-            return None
-        except Exception as e:
-            print("An unexpected error occurred:", str(e))
-            return None
 
+    def get_eat_drink_by_trip(self, trip_id):
+        """Retrieve all eat&drink places from a specific trip in the database."""
+        return self.get_places("eat_drink", trip_id)
 
-    def add_essentials(self, trip_id, name, coordinates, address, day, comments, external_url):
-        """Create and save new essentials to the database.
 
-        Args:
-            name (str): The name of essentials place.
-            coordinates(str): The latitude and longitude of the essentials place.
-            address (str): The address of the essentials place.
-            day (array): The day(s) on which this point will be used during the trip.
-            comments (str): Any comments pertaining that place.
-            external_url (str): Link to related website.
+    def add_eat_drink(self, trip_id, name, coordinates, address, day, comments, external_url):
+        """Create and save a new eat&drink place to the database."""
+        return self.add_place("eat_drink", trip_id, name=name, coordinates=coordinates, address=address, day=day, comments=comments, external_url=external_url)
 
-        Returns:
-            Essentials: The newly created eat&drink object if successful.
-            None: If an error occurred.
-        """
-        new_essentials = Essentials(
-            trip_id=trip_id,
-            name=name,
-            coordinates=coordinates,
-            address=address,
-            day=day,
-            comments=comments,
-            external_url=external_url)
-        try:
-            db.session.add(new_essentials)
-            db.session.commit()
-            return new_essentials
-        except Exception as e:
-            db.session.rollback()
-            print("An error has occurred while creating essentials place: ", str(e))
 
+    def update_eat_drink(self, eat_drink_id, name, coordinates, address, day, comments, external_url):
+        """Update an existing eat&drink place's details."""
+        return self.update_place("eat_drink", eat_drink_id, name=name, coordinates=coordinates, address=address, day=day, comments=comments, external_url=external_url)
 
-    def update_essentials(self, essentials_id, name, coordinates, address, day, comments, external_url):
-        """Update an existing essentials' details.
 
-        Args:
-            essentials_id (int): The ID of the essentials place to update.
-            name (str): New essentials name to update.
-            coordinates (str): New latitude and longitude to update.
-            address (str): New address to update.
-            day (array): The day(s) on which this point will be used during the trip.
-            comments (str): New comment to update.
-            external_url (str): New external link to update.
+    def delete_eat_drink(self, eat_drink_id):
+        """Deletes a eat&drink place from the database by its ID."""
+        return self.delete_place("eat_drink", eat_drink_id)
 
-        Returns:
-            Essentials: The updated essentials object if successful.
-            None: If the essentials object is not found or an error occurred.
-        """
-        essentials = Essentials.query.get(essentials_id)
-        if not essentials:
-            return None
-        essentials.name = name
-        essentials.coordinates = coordinates
-        essentials.address = address
-        essentials.day = day
-        essentials.comments = comments
-        essentials.external_url = external_url
-        try:
-            db.session.commit()
-            return essentials
-        except Exception as e:
-            db.session.rollback()
-            print("An error has occurred while updating essentials place: ", str(e))
-            return None
 
+    # ESSENTIALS FUNCTIONS
 
-    def delete_essentials(self, essentials_id):
-        """
-        Deletes essentials from the database by its ID.
+    def get_essentials(self):
+        """Retrieve all essentials from the database."""
+        return self.get_places("essentials")
 
-        Args:
-            essentials_id (int): The unique identifier of the essentials to delete.
 
-        Returns:
-            bool: True if an essentials object was successfully deleted, False otherwise.
-        """
-        try:
-            essentials_deleted = Essentials.query.filter(
-                Essentials.id == essentials_id).delete()
-            db.session.commit()
-            return essentials_deleted > 0  # returns True if an item was deleted
-        except Exception as e:
-            db.session.rollback()
-            print("An error has occurred while deleting essentials: ", str(e))
-            return False
+    def get_essentials_by_trip(self, trip_id):
+        """Retrieve all essentials from a specific trip in the database."""
+        return self.get_places("essentials", trip_id)
 
 
-# GETTING AROUND FUNCTIONS
+    def add_essentials(self, trip_id, name, coordinates, address, day, comments, external_url):
+        """Create and save a new essentials place to the database."""
+        return self.add_place("essentials", trip_id, name=name, coordinates=coordinates, address=address, day=day, comments=comments, external_url=external_url)
 
-    def get_getting_around(self):
-        """Retrieve all getting around objects from the database.
 
-        Returns:
-            list[GettingAround]: A list of getting around objects.
-            None: If an error occurred.
-        """
-        try:
-            getting_around = GettingAround.query.all()
-            return getting_around
-        except SQLAlchemyError as e:
-            print("A database error occurred:", str(e))
-            return None
-        except Exception as e:
-            print("An unexpected error occurred:", str(e))
-            return None
+    def update_essentials(self, essentials_id, name, coordinates, address, day, comments, external_url):
+        """Update an existing essentials place's details."""
+        return self.update_place("essentials", essentials_id, name=name, coordinates=coordinates, address=address, day=day, comments=comments, external_url=external_url)
 
 
-    def get_getting_around_by_trip(self, trip_id):
-        """Retrieve all getting around objects from a specific trip in the database.
+    def delete_essentials(self, essentials_id):
+        """Deletes a essentials place from the database by its ID."""
+        return self.delete_place("essentials", essentials_id)
 
-        Returns:
-            list[GettingAround]: A list of essentials objects.
-            None: If an error occurred.
-        """
-        try:
-            getting_around = GettingAround.query.filter_by(trip_id=trip_id).all()
-            return getting_around
-        except SQLAlchemyError as e:
-            print("A database error occurred:", str(e))
-            return None
-        except Exception as e:
-            print("An unexpected error occurred:", str(e))
-            return None
 
+    # GETTING AROUND FUNCTIONS
 
-    def add_getting_around(self, trip_id, name, coordinates, address, day, comments, external_url):
-        """Create and save new getting_around to the database.
+    def get_getting_around(self):
+        """Retrieve all getting around places from the database."""
+        return self.get_places("getting_around")
 
-        Args:
-            name (str): The name of getting_around place.
-            coordinates(str): The latitude and longitude of the getting_around place.
-            address (str): The address of the getting_around place.
-            day (array): The day(s) on which this point will be used during the trip.
-            comments (str): Any comments pertaining that place.
-            external_url (str): Link to related website.
 
-        Returns:
-            GettingAround: The newly created getting_around object if successful.
-            None: If an error occurred.
-        """
-        new_getting_around = GettingAround(
-            trip_id=trip_id,
-            name=name,
-            coordinates=coordinates,
-            address=address,
-            day=day,
-            comments=comments,
-            external_url=external_url)
-        try:
-            db.session.add(new_getting_around)
-            db.session.commit()
-            return new_getting_around
-        except Exception as e:
-            db.session.rollback()
-            print("An error has occurred while creating getting around place: ", str(e))
+    def get_getting_around_by_trip(self, trip_id):
+        """Retrieve all getting around places from a specific trip in the database."""
+        return self.get_places("getting_around", trip_id)
 
 
-    def update_getting_around(self, getting_around_id, name, coordinates, address, day, comments, external_url):
-        """Update an existing getting_around details.
+    def add_getting_around(self, trip_id, name, coordinates, address, day, comments, external_url):
+        """Create and save a new getting around place to the database."""
+        return self.add_place("getting_around", trip_id, name=name, coordinates=coordinates, address=address, day=day, comments=comments, external_url=external_url)
 
-        Args:
-            getting_around_id (int): The ID of the place to update.
-            name (str): New name to update.
-            coordinates (str): New latitude and longitude to update.
-            address (str): New address to update.
-            day (array): The day(s) on which this point will be used during the trip.
-            comments (str): New comment to update.
-            external_url (str): New external link to update.
 
-        Returns:
-            GettingAround: The updated getting_around object if successful.
-            None: If the getting_around object is not found or an error occurred.
-        """
-        getting_around = GettingAround.query.get(getting_around_id)
-        if not getting_around:
-            return None
-        getting_around.name = name
-        getting_around.coordinates = coordinates
-        getting_around.address = address
-        getting_around.day = day
-        getting_around.comments = comments
-        getting_around.external_url = external_url
-        try:
-            db.session.commit()
-            return getting_around
-        except Exception as e:
-            db.session.rollback()
-            print("An error has occurred while updating getting around place: ", str(e))
-            return None
+    def update_getting_around(self, getting_around_id, name, coordinates, address, day, comments, external_url):
+        """Update an existing getting around place's details."""
+        return self.update_place("getting_around", getting_around_id, name=name, coordinates=coordinates, address=address, day=day, comments=comments, external_url=external_url)
 
 
     def delete_getting_around(self, getting_around_id):
-        """
-        Deletes getting_around from the database by its ID.
-
-        Args:
-            getting_around_id (int): The unique identifier of the getting_around to delete.
-
-        Returns:
-            bool: True if a getting_around object was successfully deleted, False otherwise.
-        """
-        try:
-            getting_around_deleted = GettingAround.query.filter(
-                GettingAround.id == getting_around_id).delete()
-            db.session.commit()
-            return getting_around_deleted > 0  # returns True if an item was deleted
-        except Exception as e:
-            db.session.rollback()
-            print("An error has occurred while deleting getting around: ", str(e))
-            return False
\ No newline at end of file
+        """Deletes a getting around place from the database by its ID."""
+        return self.delete_place("getting_around", getting_around_id)
@@ -1,16 +1,29 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Integer, String, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, JSON, Index, event
 from sqlalchemy.orm import relationship
 import uuid
 
 db = SQLAlchemy()
 
 
+def parse_coordinates(coordinates):
+    """Split a "lat, lon" string into floats. Returns (None, None) when it is missing or malformed."""
+    if not coordinates:
+        return None, None
+    try:
+        lat, lon = (float(part.strip()) for part in str(coordinates).split(","))
+    except ValueError:
+        return None, None
+    return lat, lon
+
+
 class User(db.Model):
     user_id = Column(Integer, primary_key=True, autoincrement=True)
     username = Column(String, nullable=False)
-    email = Column(String, nullable=False)
+    email = Column(String, nullable=False, unique=True, index=True)
     password = Column(String, nullable=False)
+    # "admin" or "user", only set from the command line (flask set-role), never through the API
+    role = Column(String, nullable=False, default="user", server_default="user")
 
     # One user can have many trips
     trips = relationship("Trip", backref="user")
@@ -19,143 +32,108 @@ class User(db.Model):
             "user_id": self.user_id,
             "username": self.username,
             "email": self.email,
-            "password": self.password}
+            "password": self.password,
+            "role": self.role}
 
 
 class Trip(db.Model):
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     name = Column(String, nullable=False)
-    user_id = Column(Integer, ForeignKey("user.user_id"))
+    user_id = Column(Integer, ForeignKey("user.user_id"), index=True)
     date = Column(db.Date, nullable=True)
+    # Bumped by database triggers on every change to the trip or its places (see migrations.py)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # First version whose place changes and deletions are all recorded, GET /trips/<trip_id>/changes
+    # answers clients that are older with the whole trip
+    tracked_since = Column(Integer, nullable=False, default=0, server_default="0")
+    # Creation order, the sort key of the trip list pages. Numbered by a database trigger on insert (see migrations.py)
+    created_seq = Column(Integer, unique=True, index=True)
     def to_dict(self):
         return {
             "id": self.id,
             "name": self.name,
             "user_id": self.user_id,
-            "date": self.date.isoformat() if self.date else None
+            "date": self.date.isoformat() if self.date else None,
+            "version": self.version
         }
 
-    # One trip can have many explores, stays, eat&drink, essentials, and getting around entries
-    explore = relationship("Explore", backref="trip")
-    stay = relationship("Stay", backref="trip")
-    eat_drink = relationship("EatDrink", backref="trip")
-    essentials = relationship("Essentials", backref="trip")
-    getting_around = relationship("GettingAround", backref="trip")
+    # One trip can have many places (explores, stays, eat&drink, essentials, and getting around entries)
+    places = relationship("Place", backref="trip")
 
 
-class Explore(db.Model):
+class Place(db.Model):
+    """Every place of a trip, in one table. The category column says which of the models
+    below (explore, stays, ...) a row belongs to; columns only some categories use are nullable."""
+    __tablename__ = "place"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String, nullable=False)
+    category = Column(String, nullable=False)
+    name = Column(String)
     coordinates = Column(String)
+    lat = Column(Float)  # parsed from coordinates on every insert / update
+    lon = Column(Float)
     address = Column(String)
     day = Column(JSON, default=[1])
-    price = Column(String)
+    price = Column(String)  # explore and stays only
+    status = Column(String)  # stays only
     comments = Column(String)
     external_url = Column(String)
     trip_id = Column(Integer, ForeignKey("trip.id"))
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "coordinates": self.coordinates,
-            "address": self.address,
-            "day": self.day,
-            "price": self.price,
-            "comments": self.comments,
-            "external_url": self.external_url,
-            "trip_id": self.trip_id
-        }
+    # The trip version of the row's last change, set by database triggers (see migrations.py)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
 
+    __table_args__ = (Index("ix_place_trip_id_category", "trip_id", "category"),)
+    __mapper_args__ = {"polymorphic_on": category}
+
+    # Keys of to_dict(), the columns the category uses
+    dict_fields = ("id", "name", "coordinates", "lat", "lon", "address", "day", "comments", "external_url",
+                   "trip_id")
 
-class Stay(db.Model):
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String)
-    coordinates = Column(String)
-    address = Column(String)
-    price = Column(String)
-    day = Column(JSON, default=[1])
-    status = Column(String)
-    comments = Column(String)
-    external_url = Column(String)
-    trip_id = Column(Integer, ForeignKey("trip.id"))
     def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "coordinates": self.coordinates,
-            "address": self.address,
-            "day": self.day,
-            "price": self.price,
-            "status": self.status,
-            "comments": self.comments,
-            "external_url": self.external_url,
-            "trip_id": self.trip_id
-        }
+        return {name: getattr(self, name) for name in self.dict_fields}
 
 
-class EatDrink(db.Model):
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String)
-    coordinates = Column(String)
-    address = Column(String)
-    day = Column(JSON, default=[1])
-    comments = Column(String)
-    external_url = Column(String)
-    trip_id = Column(Integer, ForeignKey("trip.id"))
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "coordinates": self.coordinates,
-            "address": self.address,
-            "day": self.day,
-            "comments": self.comments,
-            "external_url": self.external_url,
-            "trip_id": self.trip_id
-        }
+class Explore(Place):
+    __mapper_args__ = {"polymorphic_identity": "explore"}
+    dict_fields = ("id", "name", "coordinates", "lat", "lon", "address", "day", "price", "comments",
+                   "external_url", "trip_id")
 
 
-class Essentials(db.Model):
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String)
-    coordinates = Column(String)
-    address = Column(String)
-    day = Column(JSON, default=[1])
-    comments = Column(String)
-    external_url = Column(String)
-    trip_id = Column(Integer, ForeignKey("trip.id"))
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "coordinates": self.coordinates,
-            "address": self.address,
-            "day": self.day,
-            "comments": self.comments,
-            "external_url": self.external_url,
-            "trip_id": self.trip_id
-        }
+class Stay(Place):
+    __mapper_args__ = {"polymorphic_identity": "stays"}
+    dict_fields = ("id", "name", "coordinates", "lat", "lon", "address", "day", "price", "status", "comments",
+                   "external_url", "trip_id")
+
+
+class EatDrink(Place):
+    __mapper_args__ = {"polymorphic_identity": "eat_drink"}
+
+
+class Essentials(Place):
+    __mapper_args__ = {"polymorphic_identity": "essentials"}
 
 
-class GettingAround(db.Model):
+class GettingAround(Place):
+    __mapper_args__ = {"polymorphic_identity": "getting_around"}
+
+
+class PlaceTombstone(db.Model):
+    """A deleted place (or one moved to another trip), written by a database trigger, so
+    clients syncing with GET /trips/<trip_id>/changes learn about the deletion."""
+    __tablename__ = "place_tombstone"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String)
-    coordinates = Column(String)
-    address = Column(String)
-    day = Column(JSON, default=[1])
-    comments = Column(String)
-    external_url = Column(String)
-    trip_id = Column(Integer, ForeignKey("trip.id"))
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "coordinates": self.coordinates,
-            "address": self.address,
-            "day": self.day,
-            "comments": self.comments,
-            "external_url": self.external_url,
-            "trip_id": self.trip_id
-        }
+    place_id = Column(Integer, nullable=False)
+    category = Column(String, nullable=False)
+    trip_id = Column(Integer, nullable=False)
+    # The trip version of the deletion
+    version = Column(Integer, nullable=False)
+
+    __table_args__ = (Index("ix_place_tombstone_trip_id_version", "trip_id", "version"),)
+
+
+def _sync_lat_lon(mapper, connection, target):
+    target.lat, target.lon = parse_coordinates(target.coordinates)
 
 
+# Keep the numeric columns in sync with the coordinates string on every ORM write
+event.listen(Place, "before_insert", _sync_lat_lon, propagate=True)
+event.listen(Place, "before_update", _sync_lat_lon, propagate=True)
@@ -1,16 +1,32 @@
 import os, json
+import hashlib
 import re
 from datetime import timedelta
 
-from flask import Flask, request, jsonify
-from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt
+import click
+from flask import Flask, Response, request, jsonify, make_response, stream_with_context, url_for
+from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, jwt_required, get_jwt_identity, \
+    current_user
 from flask_cors import CORS
-from functools import wraps  # Importing wraps
+from functools import wraps, partial  # Importing wraps
 
-from data_manager import DataManager
+from data_manager import DataManager, PLACE_DICT_FIELDS, TRIP_FIELDS
 from data_models import db, User
-
-from services.overpass_service import fetch_overpass_results
+from db_profile import engine_options, install_profile
+from migrations import upgrade_database
+
+from services.cache import cache_stats
+from services.destination_cache import destination_cache, questionnaire_key
+from services.geo import haversine_m, element_lat_lon
+from services.jobs import suggestion_jobs, JobQueueFull
+from services.json_provider import install_json_provider, json_engine_options
+from services.overpass_cache import normalize_request
+from services.pagination import encode_cursor, parse_page_args
+from services.overpass_service import fetch_overpass_results, keep_element, project_element, submit_fetch, \
+    OVERPASS_MAX_ELEMENTS
+from services.overpass_tiles import fetch_overpass_tiles, tiled_mode_enabled, tiles_within_limit
+from services.ranking import rank_elements
+from services.spatial_hash import marker_index
 from services.overpass_queries import (
     query_places_explore_outdoor,
     query_places_explore_indoor,
@@ -20,13 +36,18 @@ from services.overpass_queries import (
     query_getting_around
 )
 from services.openai_service import get_selection_via_openai, \
-    get_destination_suggestion, get_openai_tips
+    get_destination_suggestion, get_openai_tips, get_openai_region_tips, stream_destination_suggestion, \
+    stream_openai_tips
+from services.streaming import sse_event, stream_json_items
+from services.tips_cache import get_cached_tips, markers_hash, store_tips, forget_tips, \
+    region_tips_cache, trip_region, combine_tips
 
 app = Flask(__name__)
 CORS(app,
      origins=["http://localhost:5173", "https://wanderwise-frontend-cyan.vercel.app"],  # frontend origin
      supports_credentials=True,
-     allow_headers=["Content-Type", "Authorization"],
+     allow_headers=["Content-Type", "Authorization", "If-None-Match"],
+     expose_headers=["ETag", "Location", "Retry-After", "X-Next-Cursor"],
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"]
      )
 
@@ -43,26 +64,125 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 db_path = os.path.join(basedir, 'data', 'library.sqlite')
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
 
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**engine_options(), **json_engine_options()}
+
 os.makedirs(os.path.join(basedir, 'data'), exist_ok=True)
 
 db.init_app(app)
 
 data_manager = DataManager()
 
-# Used only to create the tables
-# with app.app_context():
-#     db.create_all()
+# Apply the SQLite connection profile, create missing tables and apply pending schema migrations
+with app.app_context():
+    install_profile(db.engine)
+    upgrade_database()
+
+# Responses (and JSON columns, see SQLALCHEMY_ENGINE_OPTIONS) are encoded with orjson when it's installed
+install_json_provider(app)
+
+@jwt.user_lookup_loader
+def load_current_user(_jwt_header, jwt_data):
+    """ Runs on every JWT protected request: a token of a deleted user is rejected with 401.
+    Answered from the per-process identity cache, so most requests don't query the user table. """
+    try:
+        return data_manager.get_identity(int(jwt_data["sub"]))
+    except (TypeError, ValueError):
+        return None
+
+
+@jwt.user_lookup_error_loader
+def current_user_not_found(_jwt_header, jwt_data):
+    return jsonify(msg="This user doesn't exist"), 401
+
 
 def admin_required(fn):
     @wraps(fn)
     @jwt_required()
     def wrapper(*args, **kwargs):
-        claims = get_jwt()
-        if claims['role'] != 'admin':
+        # The role stored on the user (set with `flask set-role`), not a token claim,
+        # so demoting an admin takes effect once the identity cache entry expires
+        if current_user["role"] != 'admin':
             return jsonify(msg='You are not allowed to see this, you are not an admin!'), 403
         return fn(*args, **kwargs)
     return wrapper
 
+
+@app.cli.command("set-role")
+@click.argument("email")
+@click.argument("role", type=click.Choice(["admin", "user"]))
+def set_role(email, role):
+    """ Give the account with EMAIL the admin or user role: flask --app main set-role EMAIL admin """
+    if not data_manager.set_user_role(email, role):
+        raise click.ClickException(f"No single user with email {email}")
+    click.echo(f"{email} is now {role}")
+
+def trip_markers(places):
+    """ Name + lat/lon of every place of a trip (as returned by DataManager.load_trip) that has coordinates. """
+    markers = []
+    for item_list in places.values():
+        for item in item_list:
+            if item["lat"] is not None and item["lon"] is not None:
+                markers.append({
+                    "name": item["name"],
+                    "lat": item["lat"],
+                    "lon": item["lon"]
+                })
+    return markers
+
+
+def trip_etag_response(trip_id, representation, build_response):
+    """ Answers 304 Not Modified when the client already has the current version of the trip,
+    otherwise builds the response and tags it with the version. Only the trip row is read for the check. """
+    version = data_manager.get_trip_version(trip_id)
+    if version is None:
+        return build_response()
+    etag = f"{trip_id}-{version}-{representation}"
+    if request.query_string:  # ?fields=, ?cursor=... select a different representation
+        etag += "-" + hashlib.sha1(request.query_string).hexdigest()[:12]
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(build_response())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    response.cache_control.no_cache = True  # cache, but revalidate on every use
+    return response
+
+
+def page_response(items, next_after):
+    """ One page of a list endpoint, with the cursor of the next page in X-Next-Cursor. """
+    response = jsonify(items)
+    if next_after is not None:
+        response.headers["X-Next-Cursor"] = encode_cursor(next_after)
+    return response
+
+
+def place_page_response(category, trip_id):
+    """ Places of one category of a trip, supporting ?fields=, ?limit= and ?cursor=. """
+    try:
+        fields, after, limit = parse_page_args(request.args, PLACE_DICT_FIELDS[category])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    page = data_manager.list_places(category, trip_id, fields, after, limit)
+    if page is None:
+        return jsonify({"error": "Could not load places"}), 500
+    return page_response(*page)
+
+
+def wants_event_stream():
+    """ Streaming is opt-in: ?stream=1 or an Accept: text/event-stream header. """
+    return request.args.get("stream") in ("1", "true") or \
+        "text/event-stream" in request.headers.get("Accept", "")
+
+
+def event_stream_response(events):
+    """ Sends the generated Server-Sent Events to the client as they are produced. """
+    return Response(stream_with_context(events), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.route('/', methods=['GET'])
 def index():
         return jsonify({"message": "Welcome to WanderWise Backend"})
@@ -81,7 +201,7 @@ def login():
     else:
         return jsonify({ 'msg': 'This user does not exist.'}), 500
 
-    access_token = create_access_token(identity=str(user.user_id), additional_claims={"role": "user"})
+    access_token = create_access_token(identity=str(user.user_id))
     refresh_token = create_refresh_token(identity=str(user.user_id))
     return jsonify({"access_token": access_token, "refresh_token": refresh_token})
 
@@ -127,15 +247,14 @@ def get_current_user():
 @app.route("/me", methods=["PUT"])
 @jwt_required()
 def update_current_user():
-    user_id = int(get_jwt_identity())  # this comes from the token
-    user = User.query.get(user_id)
-    if user:
-        data = request.get_json()
-        new_username = data.get("username")
-        new_email = data.get("email")
-        new_password = data.get("password")
+    user_id = current_user["user_id"]  # this comes from the token
+    data = request.get_json()
+    new_username = data.get("username")
+    new_email = data.get("email")
+    new_password = data.get("password")
 
-        updated_user = data_manager.update_user(user_id, new_username, new_email, new_password)
+    updated_user = data_manager.update_user(user_id, new_username, new_email, new_password)
+    if updated_user:
         return jsonify(updated_user.to_dict())
 
     return jsonify({"error": "User not found"}), 404
@@ -145,30 +264,25 @@ def update_current_user():
 @jwt_required()
 def get_all_trips():
     """ Retrieves and displays all trips. """
-    user_id = int(get_jwt_identity())
-    user = User.query.filter_by(user_id=user_id).first()
-    if not user:
-        return jsonify(msg="This user doesn't exist"), 401
-
-    user_dictionary = user.to_dict()
+    # ?fields= selects the columns, ?limit= / ?cursor= page through the trips (next cursor in X-Next-Cursor)
+    try:
+        fields, after, limit = parse_page_args(request.args, TRIP_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    trips = data_manager.get_trips(user_dictionary["user_id"])
-    return jsonify([trip.to_dict() for trip in trips])
+    page = data_manager.list_trips(current_user["user_id"], fields, after, limit)
+    if page is None:
+        return jsonify({"error": "Could not load trips"}), 500
+    return page_response(*page)
 
 
 @app.route('/trips', methods=['POST'])
 @jwt_required()
 def create_trip():
     """Creates a new trip object, with the temporary name of New Trip, and saves it to the database. """
-    user_id = get_jwt_identity()
-    user = User.query.filter_by(user_id=user_id).first()
-
-    if not user:
-        return jsonify(msg="Invalid user"), 401
-
     trip_name = request.json.get("name", "New Trip")
     trip_date = request.json.get("date")
-    trip = data_manager.create_trip(trip_name, user.user_id, trip_date)
+    trip = data_manager.create_trip(trip_name, current_user["user_id"], trip_date)
     return jsonify({"trip": trip.to_dict()}), 201
 
 
@@ -177,6 +291,7 @@ def create_trip():
 def delete_trip(trip_id):
     """Deletes an entire trip from the database. """
     data_manager.delete_trip(trip_id)
+    forget_tips(trip_id)
     return jsonify({"message": "Trip deleted", "trip_id": trip_id}), 200
 
 
@@ -184,22 +299,14 @@ def delete_trip(trip_id):
 @jwt_required()
 def open_trip(trip_id):
     """ Retrieves and displays all tables from the trip with the specified ID. """
-    trip = data_manager.open_trip(trip_id)
-    if not trip:
-        return jsonify({"error": "Trip not found"}), 404
-    explore = data_manager.get_explore_by_trip(trip_id)
-    stays = data_manager.get_stays_by_trip(trip_id)
-    eat_drink = data_manager.get_eat_drink_by_trip(trip_id)
-    essentials = data_manager.get_essentials_by_trip(trip_id)
-    getting_around = data_manager.get_getting_around_by_trip(trip_id)
-    return jsonify({
-        "trip": trip.to_dict(),
-        "explore": [expl.to_dict() for expl in explore],
-        "stays": [stay.to_dict() for stay in stays],
-        "eat_drink": [eat.to_dict() for eat in eat_drink],
-        "essentials": [essential.to_dict() for essential in essentials],
-        "getting_around": [around.to_dict() for around in getting_around]
-    })
+    def build_response():
+        loaded = data_manager.load_trip(trip_id)
+        if not loaded:
+            return jsonify({"error": "Trip not found"}), 404
+        trip, places = loaded
+        return jsonify({"trip": trip, **places})
+
+    return trip_etag_response(trip_id, "trip", build_response)
 
 
 @app.route('/trips/<trip_id>', methods=['PUT'])
@@ -208,163 +315,50 @@ def update_trip(trip_id):
     """Updates all data from the forms."""
     data = request.get_json()
 
-    # Update trip name if provided
+    # Trip details and every added / edited / deleted row are saved in one transaction.
+    # When the delete button for a row is clicked on the frontend, react changes its delete state to true.
     new_name = data.get("name")
     new_date = data.get("date")
-    trip = data_manager.update_trip(trip_id, new_name, new_date)
+    try:
+        trip = data_manager.apply_trip_changes(trip_id, new_name, new_date, data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     if not trip:
         return jsonify({"error": "Trip not found or update failed"}), 404
 
-    # Update or add eat&drink
-    for eat_drink_data in data.get("eat_drink", []):
-        eat_drink_id = eat_drink_data.get("id")
-        if eat_drink_data.get("deleted"): # When the delete button for the row is clicked on the frontend, react will change delete state to true.
-            data_manager.delete_eat_drink(eat_drink_id)
-        elif eat_drink_id:
-            data_manager.update_eat_drink(
-                eat_drink_id=eat_drink_id,
-                name=eat_drink_data.get("name"),
-                coordinates=eat_drink_data.get("coordinates"),
-                address=eat_drink_data.get("address"),
-                day=eat_drink_data.get("day"),
-                comments=eat_drink_data.get("comments"),
-                external_url=eat_drink_data.get("external_url"),
-            )
-        else:
-            data_manager.add_eat_drink(
-                trip_id=trip_id,
-                name=eat_drink_data.get("name"),
-                coordinates=eat_drink_data.get("coordinates"),
-                address=eat_drink_data.get("address"),
-                day=eat_drink_data.get("day"),
-                comments=eat_drink_data.get("comments"),
-                external_url=eat_drink_data.get("external_url"),
-            )
-
-    # Update or add stays
-    for stay_data in data.get("stays", []):
-        stay_id = stay_data.get("id", None)
-        if stay_data.get("deleted"): # When the delete button for the row is clicked on the frontend, react will change delete state to true.
-            data_manager.delete_stay(stay_id)
-        elif stay_id:
-            data_manager.update_stay(
-                stay_id=stay_id,
-                name=stay_data.get("name"),
-                coordinates=stay_data.get("coordinates"),
-                address=stay_data.get("address"),
-                day=stay_data.get("day"),
-                price=stay_data.get("price"),
-                status=stay_data.get("status"),
-                comments=stay_data.get("comments"),
-                external_url=stay_data.get("external_url"),
-            )
-        else:
-            data_manager.add_stay(
-                trip_id=trip_id,
-                name=stay_data.get("name"),
-                coordinates=stay_data.get("coordinates"),
-                address=stay_data.get("address"),
-                day=stay_data.get("day"),
-                price=stay_data.get("price"),
-                status=stay_data.get("status"),
-                comments=stay_data.get("comments"),
-                external_url=stay_data.get("external_url"),
-            )
-
-    # Update or add explore
-    for explore_data in data.get("explore", []):
-        explore_id = explore_data.get("id")
-        if explore_data.get("deleted"): # When the delete button for the row is clicked on the frontend, react changes delete state to true.
-            data_manager.delete_explore(explore_id)
-        elif explore_id:
-            data_manager.update_explore(
-                explore_id=explore_id,
-                name=explore_data.get("name"),
-                coordinates=explore_data.get("coordinates"),
-                address=explore_data.get("address"),
-                day=explore_data.get("day"),
-                price=explore_data.get("price"),
-                comments=explore_data.get("comments"),
-                external_url=explore_data.get("external_url"),
-            )
-        else:
-            data_manager.add_explore(
-                trip_id=trip_id,
-                name=explore_data.get("name"),
-                coordinates=explore_data.get("coordinates"),
-                address=explore_data.get("address"),
-                day=explore_data.get("day"),
-                price=explore_data.get("price"),
-                comments=explore_data.get("comments"),
-                external_url=explore_data.get("external_url"),
-            )
-
-    # Update or add essentials
-    for essentials_data in data.get("essentials", []):
-        essentials_id = essentials_data.get("id")
-        if essentials_data.get("deleted"):  # When the delete button for the row is clicked on the frontend, react changes delete state to true.
-            data_manager.delete_essentials(essentials_id)
-        elif essentials_id:
-            data_manager.update_essentials(
-                essentials_id=essentials_id,
-                name=essentials_data.get("name"),
-                coordinates=essentials_data.get("coordinates"),
-                address=essentials_data.get("address"),
-                day=essentials_data.get("day"),
-                comments=essentials_data.get("comments"),
-                external_url=essentials_data.get("external_url"),
-            )
-        else:
-            data_manager.add_essentials(
-                trip_id=trip_id,
-                name=essentials_data.get("name"),
-                coordinates=essentials_data.get("coordinates"),
-                address=essentials_data.get("address"),
-                day=essentials_data.get("day"),
-                comments=essentials_data.get("comments"),
-                external_url=essentials_data.get("external_url"),
-            )
-
-    # Update or add getting_around
-    for getting_around_data in data.get("getting_around", []):
-        getting_around_id = getting_around_data.get("id")
-        if getting_around_data.get("deleted"):  # When the delete button for the row is clicked on the frontend, react changes delete state to true.
-            data_manager.delete_getting_around(getting_around_id)
-        elif getting_around_id:
-            data_manager.update_getting_around(
-                getting_around_id=getting_around_id,
-                name=getting_around_data.get("name"),
-                coordinates=getting_around_data.get("coordinates"),
-                address=getting_around_data.get("address"),
-                day=getting_around_data.get("day"),
-                comments=getting_around_data.get("comments"),
-                external_url=getting_around_data.get("external_url"),
-            )
-        else:
-            data_manager.add_getting_around(
-                trip_id=trip_id,
-                name=getting_around_data.get("name"),
-                coordinates=getting_around_data.get("coordinates"),
-                address=getting_around_data.get("address"),
-                day=getting_around_data.get("day"),
-                comments=getting_around_data.get("comments"),
-                external_url=getting_around_data.get("external_url"),
-            )
-
-    explore = data_manager.get_explore_by_trip(trip_id)
-    stays = data_manager.get_stays_by_trip(trip_id)
-    eat_drink = data_manager.get_eat_drink_by_trip(trip_id)
-    essentials = data_manager.get_essentials_by_trip(trip_id)
-    getting_around = data_manager.get_getting_around_by_trip(trip_id)
-
-    return jsonify({
-        "trip": trip.to_dict(),
-        "explore": [expl.to_dict() for expl in explore],
-        "stays": [stay.to_dict() for stay in stays],
-        "eat_drink": [eat.to_dict() for eat in eat_drink],
-        "essentials": [essential.to_dict() for essential in essentials],
-        "getting_around": [around.to_dict() for around in getting_around]
-        })
+    # With ?since=<version> only the changes are echoed back, like GET /trips/<trip_id>/changes
+    since = request.args.get("since", type=int)
+    if since is not None:
+        changes = data_manager.get_trip_changes(trip_id, since)
+        if changes is None:
+            return jsonify({"error": "Trip not found"}), 404
+        return jsonify(changes)
+
+    loaded = data_manager.load_trip(trip_id)
+    if not loaded:
+        return jsonify({"error": "Trip not found"}), 404
+    trip, places = loaded
+    return jsonify({"trip": trip, **places})
+
+
+@app.route('/trips/<trip_id>/changes', methods=['GET'])
+@jwt_required()
+def get_trip_changes(trip_id):
+    """ Places created, changed or deleted since the version of the trip the client has (?since=<version>).
+    The client removes the "deleted" ids first, then upserts the returned rows, and passes trip.version
+    as the next since. With "full": true the answer is the whole trip and replaces the client's copy. """
+    since = request.args.get("since", type=int)
+    if since is None or since < 0:
+        return jsonify({"error": "since must be a trip version"}), 400
+
+    def build_response():
+        changes = data_manager.get_trip_changes(trip_id, since)
+        if changes is None:
+            return jsonify({"error": "Trip not found"}), 404
+        return jsonify(changes)
+
+    return trip_etag_response(trip_id, "changes", build_response)
+
 
 @app.route('/trips/<trip_id>/map', methods=['GET'])
 # """" Displays the map of the trip with the specified ID, along with all
@@ -393,6 +387,22 @@ def get_destination():
     season = data.get("season")
     acc = data.get("acc")
 
+    # Identical questionnaires get the answer of the first submission
+    cache_key = questionnaire_key(data)
+    cached = destination_cache.get(cache_key)
+    if cached is not None:
+        if wants_event_stream():
+            events = [sse_event("destination", d) for d in cached.get("destinations", [])]
+            return event_stream_response(iter(events + [sse_event("done", cached)]))
+        return jsonify(cached), 200
+
+    # Streaming mode: each destination is sent as soon as the model finished writing it
+    if wants_event_stream():
+        deltas = stream_destination_suggestion(location, goal, interests, fame, length, transport, preferred, avoid, season, acc)
+        return event_stream_response(stream_json_items(
+            deltas, "destinations", "destination",
+            on_complete=lambda result: destination_cache.set(cache_key, result)))
+
     # Step 3: Call AI function to get suggestions of destinations
     try:
         destinations = get_destination_suggestion(location, goal, interests, fame, length, transport, preferred, avoid, season, acc)
@@ -408,6 +418,7 @@ def get_destination():
         return jsonify({"error": "Invalid JSON from OpenAI",
                         "raw": destinations}), 500
 
+    destination_cache.set(cache_key, destination_suggestions)
     return jsonify(destination_suggestions), 200
 
 
@@ -419,46 +430,52 @@ def get_destination():
 @app.route('/trips/<trip_id>/explore', methods=['GET'])
 @jwt_required()
 def get_explore_of_trip(trip_id):
-    explore = data_manager.get_explore_by_trip(trip_id)
-    return jsonify([expl.to_dict() for expl in explore])
+    def build_response():
+        return place_page_response("explore", trip_id)
+
+    return trip_etag_response(trip_id, "explore", build_response)
 
 
 @app.route('/trips/<trip_id>/stays', methods=['GET'])
 @jwt_required()
 def get_stays_of_trip(trip_id):
-    stays = data_manager.get_stays_by_trip(trip_id)
-    return jsonify([stay.to_dict() for stay in stays])
+    def build_response():
+        return place_page_response("stays", trip_id)
+
+    return trip_etag_response(trip_id, "stays", build_response)
 
 
 @app.route('/trips/<trip_id>/eat-drink', methods=['GET'])
 @jwt_required()
 def get_eat_drink_of_trip(trip_id):
-    eat_drink = data_manager.get_eat_drink_by_trip(trip_id)
-    return jsonify([eat.to_dict() for eat in eat_drink])
+    def build_response():
+        return place_page_response("eat_drink", trip_id)
+
+    return trip_etag_response(trip_id, "eat_drink", build_response)
 
 
 @app.route('/trips/<trip_id>/essentials', methods=['GET'])
 @jwt_required()
 def get_essentials_of_trip(trip_id):
-    essentials = data_manager.get_essentials_by_trip(trip_id)
-    return jsonify([essential.to_dict() for essential in essentials])
+    def build_response():
+        return place_page_response("essentials", trip_id)
+
+    return trip_etag_response(trip_id, "essentials", build_response)
 
 
 @app.route('/trips/<trip_id>/getting-around', methods=['GET'])
 @jwt_required()
 def get_getting_around_of_trip(trip_id):
-    getting_around = data_manager.get_getting_around_by_trip(trip_id)
-    return jsonify([around.to_dict() for around in getting_around])
+    def build_response():
+        return place_page_response("getting_around", trip_id)
 
+    return trip_etag_response(trip_id, "getting_around", build_response)
 
-@app.route('/trips/<trip_id>/suggestions', methods=['POST'])
-@jwt_required()
-def get_suggestions(trip_id):
 
-    # Step 1: Get JSON from frontend
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "No input received"}), 400
+def suggest_places(trip_id, data):
+    """ Suggestion pipeline of POST /trips/<trip_id>/suggestions: Overpass search, filtering against the
+    trip's markers, ranking and AI selection. Returns a (payload, status) tuple, so it can run inside the
+    request or as a background job. """
 
     # Step 2: Extract key fields
     category = data.get("category")
@@ -471,97 +488,101 @@ def get_suggestions(trip_id):
     radius = data.get("radius", 2000)  # default to 2km if not provided
     # print("Lat: ", lat, "Lon: ", lon, "Radius: ", radius)
 
+    # Snap the search to the cache grid, the query is built for the snapped (slightly larger) circle
+    # with its result limit scaled to that circle's area
+    filters = {"activityType": activity_type, "cuisine": cuisine, "style": style, "type": type_answer}
+    try:
+        cache_key, query_lat, query_lon, query_radius, query_limit_scale = normalize_request(
+            category, filters, lat, lon, radius)
+        lat, lon, radius = float(lat), float(lon), float(radius)
+    except (TypeError, ValueError):
+        return {"error": "Invalid lat, lon or radius"}, 400
+
     # Step 3: Select correct query function
     if category == "explore" and activity_type == "Outdoor":
-        my_query = query_places_explore_outdoor(lat, lon, radius)
+        build_query = query_places_explore_outdoor
     elif category == "explore" and activity_type == "Indoor":
-        my_query = query_places_explore_indoor(lat, lon, radius)
+        build_query = query_places_explore_indoor
     elif category == "stays":
-        my_query = query_stays(lat, lon, radius, style)
+        build_query = partial(query_stays, styles=style)
     elif category == "eatDrink":
-        my_query = query_eat_drink(lat, lon, radius, cuisine)
+        build_query = partial(query_eat_drink, cuisine=cuisine)
     elif category == "essentials":
-        my_query = query_essentials(lat, lon, radius, type_answer)
+        build_query = partial(query_essentials, ess_type=type_answer)
     elif category == "gettingAround":
-        my_query = query_getting_around(lat, lon, radius, type_answer)
+        build_query = partial(query_getting_around, around_types=type_answer)
     else:
-        return jsonify({"error": "No matching query found"}), 400
+        return {"error": "No matching query found"}, 400
 
-    # Step 4: Fetch results from overpass
+    # Step 4: Start fetching results from overpass (or the overpass cache / tile store) in the background,
+    # searches covering too many tiles fall back to the regular query
+    if tiled_mode_enabled() and tiles_within_limit(lat, lon, radius):
+        overpass_future = submit_fetch(fetch_overpass_tiles, build_query, category, filters, lat, lon, radius)
+    else:
+        # the elements kept while streaming are capped like the query's result limit
+        max_elements = int(OVERPASS_MAX_ELEMENTS * query_limit_scale)
+        overpass_future = submit_fetch(
+            lambda: fetch_overpass_results(build_query(query_lat, query_lon, query_radius, limit_scale=query_limit_scale),
+                                           cache_key=cache_key, max_elements=max_elements))
+
+    # Step 5: Meanwhile fetch all existing places for this trip
+    loaded = data_manager.load_trip(trip_id)
+    if not loaded:
+        return {"error": "Trip not found"}, 404
+    trip, places = loaded
+
+    # Combine into a single list of dicts with name + lat/lon
+    existing_markers = trip_markers(places)
+
+    # Filtering of results based on existing markers (so I don't get suggested what's already in my trip).
+    # Nearby markers with a similar name count too, the same café can be stored as node or way centre.
+    is_existing_marker = marker_index(existing_markers, category, ref_lat=lat)
+
+    # Step 6: Join the overpass fetch
     try:
-        # print("Query:" , my_query)
-        results = fetch_overpass_results(my_query)
+        results = overpass_future.result()
 
     except Exception as e:
         app.logger.exception("Overpass fetch failed")
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
     # if results come back empty, return the error message
     if "elements" not in results:
         error_msg = results.get("error", "No elements returned")
-        return jsonify({"error": error_msg}), 502
-
-    # Step 5: Fetch all existing places for this trip
-    explore = data_manager.get_explore_by_trip(trip_id)
-    stays = data_manager.get_stays_by_trip(trip_id)
-    eat_drink = data_manager.get_eat_drink_by_trip(trip_id)
-    essentials = data_manager.get_essentials_by_trip(trip_id)
-    getting_around = data_manager.get_getting_around_by_trip(trip_id)
-
-    # Combine into a single list of dicts with name + lat/lon
-    existing_markers = []
-    for item_list in [explore, stays, eat_drink, essentials, getting_around]:
-        for item in item_list:
-            if item.coordinates is not None:
-                existing_markers.append({
-                    "name": item.name,
-                    "lat": float(item.coordinates.split(",")[0].strip()),
-                    "lon": float(item.coordinates.split(",")[1].strip())
-            })
-
-    # Simple filtering of results based on existing markers (so I don't get suggested what's already in my trip)
-    precision = 6  # rounding to avoid tiny floating point differences
-
-    existing_coordinates = {(round(marker['lat'], precision), round(marker['lon'], precision)) for marker in existing_markers}
+        return {"error": error_msg}, 502
 
     filtered_elements = []
 
     # make sure the element has lat and lon (even when it has a center - which is displayed differently)
     print(len(results["elements"])) # see how many elements overpass returned
 
-    elements = results["elements"]
-
-    # Remove RELATIONS — they produce hundreds of thousands of entries
-    elements = [e for e in elements if e["type"] != "relation"]
-
-    # Remove relation MEMBERS that sneak in (ref/role objects)
-    elements = [e for e in elements if not ("ref" in e and "role" in e)]
-
-    # Only keep real POIs that have a name
-    elements = [e for e in elements if e.get("tags", {}).get("name")]
+    # Remove relations, relation members and unnamed elements in one pass
+    # (already done while parsing when the response was streamed)
+    elements = [project_element(e) for e in results["elements"] if keep_element(e)]
 
     for el in elements:
-        if el.get("nodes"):
-            del el["nodes"]
-        lat = el.get("lat") or el.get("center", {}).get("lat")
-        lon = el.get("lon") or el.get("center", {}).get("lon")
-        if lat and lon:
-            if (round(lat, precision), round(lon, precision)) not in existing_coordinates: # check if is already existent in my markers
-                el["lat"] = lat
-                el["lon"] = lon
+        el_lat, el_lon = element_lat_lon(el)
+        if el_lat and el_lon:
+            if haversine_m(lat, lon, el_lat, el_lon) > radius:  # cached results cover a slightly larger circle
+                continue
+            if not is_existing_marker(el_lat, el_lon, el["tags"].get("name")): # check if is already existent in my markers
+                el["lat"] = el_lat
+                el["lon"] = el_lon
                 filtered_elements.append(el)
-    print("Filtered elements: ", filtered_elements)
+
+    # Only the best ranked elements (with a reduced set of tags) are sent to the AI
+    filtered_elements = rank_elements(filtered_elements, data, lat, lon, radius)
     print(len(filtered_elements))  # see how many filtered elements I'm sending to AI
         # else:
             # print(f"Skipping element with missing coordinates: {el}")
 
-    # Step 6: Call AI function to make the selection of the most relevant results
+    # Step 7: Call AI function to make the selection of the most relevant results
     try:
         top_selection_text = get_selection_via_openai(data, filtered_elements)
 
     except Exception as e:
         print("Error reaching OpenAI:", str(e))
-        return jsonify({"error": "openai_unreachable"}), 502
+        return {"error": "openai_unreachable"}, 502
 
     try:
         clean_text = re.sub(r"^```(?:json)?|```$", "", top_selection_text.strip(), flags=re.MULTILINE)
@@ -571,10 +592,84 @@ def get_suggestions(trip_id):
 
     except json.JSONDecodeError:
         # If GPT response isn't valid JSON, return it as-is for debugging
-        return jsonify(
-            {"error": "Invalid JSON from OpenAI", "raw": clean_text}), 500
+        return {"error": "Invalid JSON from OpenAI", "raw": clean_text}, 500
+
+    return top_selection, 200
 
-    return jsonify(top_selection), 200
+
+def wants_async_job():
+    """ Job mode is opt-in: ?async=1 or a Prefer: respond-async header. """
+    return request.args.get("async") in ("1", "true") or \
+        "respond-async" in request.headers.get("Prefer", "")
+
+
+def run_in_app_context(fn, *args):
+    """ Background jobs run outside of any request, the database session needs an app context. """
+    with app.app_context():
+        return fn(*args)
+
+
+@app.route('/trips/<trip_id>/suggestions', methods=['POST'])
+@jwt_required()
+def get_suggestions(trip_id):
+
+    # Step 1: Get JSON from frontend
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "No input received"}), 400
+
+    # Job mode: the search runs on the bounded suggestion pool and is polled with GET .../suggestions/<job_id>
+    if wants_async_job():
+        try:
+            job_id = suggestion_jobs.submit(run_in_app_context, suggest_places, trip_id, data,
+                                            meta={"trip_id": trip_id, "user_id": get_jwt_identity()})
+        except JobQueueFull:
+            return jsonify({"error": "Too many pending suggestion searches, try again later"}), 503, \
+                {"Retry-After": "5"}
+        location = url_for("get_suggestion_job", trip_id=trip_id, job_id=job_id)
+        return jsonify({"job_id": job_id, "status": "queued"}), 202, {"Location": location}
+
+    payload, status = suggest_places(trip_id, data)
+    return jsonify(payload), status
+
+
+@app.route('/trips/<trip_id>/suggestions/<job_id>', methods=['GET'])
+@jwt_required()
+def get_suggestion_job(trip_id, job_id):
+    """ Status of a suggestion job. 202 while it is queued or running, then the status and
+    result the synchronous endpoint would have answered with. """
+    job = suggestion_jobs.get(job_id)
+    if not job or job["trip_id"] != trip_id or job["user_id"] != get_jwt_identity():
+        return jsonify({"error": "Job not found"}), 404
+
+    if job["status"] in ("queued", "running"):
+        return jsonify({"job_id": job_id, "status": job["status"]}), 202, {"Retry-After": "2"}
+
+    return jsonify({"job_id": job_id, "status": job["status"], "result": job["result"]}), job["status_code"]
+
+
+def region_tips_for(markers):
+    """ General tips of the region the trip's markers are in, from the region cache or generated once for
+    the region. None (tips are generated for the trip as a whole) for trips spanning several regions or
+    when the region tips can't be generated. """
+    region = trip_region(markers)
+    if region is None:
+        return None
+    region_tips = region_tips_cache.get(region["cell"])
+    if region_tips is not None:
+        return region_tips
+
+    try:
+        text = get_openai_region_tips(region["lat"], region["lon"])
+        region_tips = json.loads(re.sub(r"^```(?:json)?|```$", "", text.strip(), flags=re.MULTILINE))["tips"]
+    except Exception as e:
+        print("Error generating region tips:", str(e))
+        return None
+    if not isinstance(region_tips, list) or not region_tips:
+        return None
+
+    region_tips_cache.set(region["cell"], region_tips)
+    return region_tips
 
 
 @app.route('/trips/<trip_id>/tips', methods=['GET'])
@@ -582,26 +677,40 @@ def get_suggestions(trip_id):
 def get_travel_tips(trip_id):
 
     # Step 1: Fetch all existing places for this trip
-    explore = data_manager.get_explore_by_trip(trip_id)
-    stays = data_manager.get_stays_by_trip(trip_id)
-    eat_drink = data_manager.get_eat_drink_by_trip(trip_id)
-    essentials = data_manager.get_essentials_by_trip(trip_id)
-    getting_around = data_manager.get_getting_around_by_trip(trip_id)
+    loaded = data_manager.load_trip(trip_id)
+    if not loaded:
+        return jsonify({"error": "Trip not found"}), 404
+    trip, places = loaded
 
     # Combine into a single list of dicts with name + lat/lon
-    existing_markers = []
-    for item_list in [explore, stays, eat_drink, essentials, getting_around]:
-        for item in item_list:
-            if item.coordinates is not None:
-                existing_markers.append({
-                    "name": item.name,
-                    "lat": float(item.coordinates.split(",")[0].strip()),
-                    "lon": float(item.coordinates.split(",")[1].strip())
-            })
-
-    # Step 2: Call AI function to create tips based on existing markers
+    existing_markers = trip_markers(places)
+
+    # Tips only depend on the markers, they are regenerated when places were added, moved or removed
+    marker_hash = markers_hash(existing_markers)
+    cached = get_cached_tips(trip_id, marker_hash)
+    if cached is not None:
+        if wants_event_stream():
+            events = [sse_event("tip", tip) for tip in cached.get("tips", [])]
+            return event_stream_response(iter(events + [sse_event("done", cached)]))
+        return jsonify(cached), 200
+
+    # Step 2: General tips of the trip's region, generated once per region and shared between trips
+    region_tips = region_tips_for(existing_markers)
+
+    # Streaming mode: each tip is sent as soon as the model finished writing it
+    if wants_event_stream():
+        def events():
+            for tip in region_tips or []:
+                yield sse_event("tip", tip)
+            yield from stream_json_items(
+                stream_openai_tips(existing_markers, region_tips), "tips", "tip",
+                on_complete=lambda result: store_tips(trip_id, marker_hash, result),
+                finalize=lambda result: combine_tips(region_tips, result))
+        return event_stream_response(events())
+
+    # Step 3: Call AI function to create tips based on existing markers
     try:
-        trip_tips = get_openai_tips(existing_markers)
+        trip_tips = get_openai_tips(existing_markers, region_tips)
 
     except Exception as e:
         print("Error reaching OpenAI:", str(e))
@@ -616,8 +725,17 @@ def get_travel_tips(trip_id):
         return jsonify(
             {"error": "Invalid JSON from OpenAI", "raw": clean_text}), 500
 
+    tips = combine_tips(region_tips, tips)
+    store_tips(trip_id, marker_hash, tips)
     return jsonify(tips), 200
 
 
+@app.route('/admin/cache-stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    """ Hit/miss counters and sizes of the caches of this worker process. """
+    return jsonify(cache_stats()), 200
+
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
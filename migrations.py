@@ -0,0 +1,319 @@
+"""
+Versioned schema migrations for the SQLite database.
+
+The schema version is stored in SQLite's `PRAGMA user_version`. On startup,
+missing tables are created from the models and every migration with a higher
+version than the database is applied in order, inside one write transaction,
+so several gunicorn workers starting at once don't run them twice.
+Migrations must be idempotent: a fresh database already gets the current
+columns from create_all().
+"""
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from data_models import db, parse_coordinates
+
+# The per-category place tables before migration 4 merged them into `place`, with their category
+LEGACY_PLACE_TABLES = {"explore": "explore", "stay": "stays", "eat_drink": "eat_drink", "essentials": "essentials",
+                       "getting_around": "getting_around"}
+# Code of each legacy table in the place_index R-tree, whose ids were place id * 8 + code until migration 4
+LEGACY_INDEX_CODES = {"explore": 1, "stay": 2, "eat_drink": 3, "essentials": 4, "getting_around": 5}
+# Columns copied from the legacy tables (NULL when a table doesn't have one)
+PLACE_COPY_COLUMNS = ("name", "coordinates", "lat", "lon", "address", "day", "price", "status", "comments",
+                      "external_url", "trip_id")
+
+
+def _tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def _legacy_place_tables(conn):
+    """The legacy place tables still in the database (none in a database created after migration 4)."""
+    tables = _tables(conn)
+    return [table for table in LEGACY_PLACE_TABLES if table in tables]
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _add_column(conn, table, column, ddl):
+    if column not in _columns(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
+def _001_trip_version(conn):
+    """Trip.version, bumped by triggers on every write to the trip or its places."""
+    _add_column(conn, "trip", "version", "INTEGER NOT NULL DEFAULT 1")
+    for table in _legacy_place_tables(conn):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_insert_trip_version AFTER INSERT ON {table}
+            BEGIN UPDATE trip SET version = version + 1 WHERE id = NEW.trip_id; END""")
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_update_trip_version AFTER UPDATE ON {table}
+            BEGIN UPDATE trip SET version = version + 1 WHERE id IN (OLD.trip_id, NEW.trip_id); END""")
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_delete_trip_version AFTER DELETE ON {table}
+            BEGIN UPDATE trip SET version = version + 1 WHERE id = OLD.trip_id; END""")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trip_update_version AFTER UPDATE OF name, date ON trip
+        BEGIN UPDATE trip SET version = version + 1 WHERE id = NEW.id; END""")
+
+
+def _002_place_lat_lon_rtree(conn):
+    """Numeric lat/lon columns backfilled from the coordinates strings, and the place_index
+    R-tree over all places, kept in sync by triggers."""
+    tables = _legacy_place_tables(conn)
+    for table in tables:
+        _add_column(conn, table, "lat", "FLOAT")
+        _add_column(conn, table, "lon", "FLOAT")
+        rows = conn.execute(f"SELECT id, coordinates FROM {table} WHERE coordinates IS NOT NULL").fetchall()
+        conn.executemany(f"UPDATE {table} SET lat = ?, lon = ? WHERE id = ?",
+                         [(*parse_coordinates(coordinates), place_id) for place_id, coordinates in rows])
+
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS place_index
+        USING rtree(id, min_lat, max_lat, min_lon, max_lon, +trip_id)""")
+    for table in tables:
+        code = LEGACY_INDEX_CODES[table]
+        conn.execute(f"DELETE FROM place_index WHERE id % 8 = {code}")
+        conn.execute(f"""
+            INSERT INTO place_index (id, min_lat, max_lat, min_lon, max_lon, trip_id)
+            SELECT id * 8 + {code}, lat, lat, lon, lon, trip_id FROM {table}
+            WHERE lat IS NOT NULL AND lon IS NOT NULL""")
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_insert_place_index AFTER INSERT ON {table}
+            WHEN NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL
+            BEGIN
+                INSERT OR REPLACE INTO place_index (id, min_lat, max_lat, min_lon, max_lon, trip_id)
+                VALUES (NEW.id * 8 + {code}, NEW.lat, NEW.lat, NEW.lon, NEW.lon, NEW.trip_id);
+            END""")
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_update_place_index AFTER UPDATE ON {table}
+            BEGIN
+                DELETE FROM place_index WHERE id = OLD.id * 8 + {code};
+                INSERT INTO place_index (id, min_lat, max_lat, min_lon, max_lon, trip_id)
+                SELECT NEW.id * 8 + {code}, NEW.lat, NEW.lat, NEW.lon, NEW.lon, NEW.trip_id
+                WHERE NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL;
+            END""")
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_delete_place_index AFTER DELETE ON {table}
+            BEGIN DELETE FROM place_index WHERE id = OLD.id * 8 + {code}; END""")
+
+
+def _003_lookup_indexes(conn):
+    """Indexes on the columns every trip load, trip list and login filters by:
+    the trip_id of the place tables, trip.user_id and a unique user.email."""
+    for table in _legacy_place_tables(conn):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_trip_id ON {table} (trip_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_trip_user_id ON trip (user_id)")
+
+    duplicates = conn.execute("SELECT email FROM user GROUP BY email HAVING COUNT(*) > 1").fetchall()
+    if duplicates:
+        # Registering twice used to be possible, keep the accounts and only speed up the lookup
+        print("Emails registered more than once, user.email index is not unique:",
+              ", ".join(email for email, in duplicates))
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_user_email ON user (email)")
+    else:
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_user_email ON user (email)")
+
+
+def _004_unified_place_table(conn):
+    """Move the rows of the five legacy place tables into the single place table and drop them.
+    Places get new ids, so every trip's version is bumped and clients reload their trips.
+    The version and place_index triggers move to the place table, whose R-tree ids are plain place ids."""
+    legacy_tables = _legacy_place_tables(conn)
+    for table in legacy_tables:
+        columns = _columns(conn, table)
+        values = ", ".join(name if name in columns else "NULL" for name in PLACE_COPY_COLUMNS)
+        conn.execute(f"""
+            INSERT INTO place (category, {", ".join(PLACE_COPY_COLUMNS)})
+            SELECT '{LEGACY_PLACE_TABLES[table]}', {values} FROM {table} ORDER BY id""")
+        conn.execute(f"DROP TABLE {table}")  # drops its triggers too
+
+    conn.execute("DELETE FROM place_index")
+    conn.execute("""
+        INSERT INTO place_index (id, min_lat, max_lat, min_lon, max_lon, trip_id)
+        SELECT id, lat, lat, lon, lon, trip_id FROM place WHERE lat IS NOT NULL AND lon IS NOT NULL""")
+
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS place_insert_trip_version AFTER INSERT ON place
+        BEGIN UPDATE trip SET version = version + 1 WHERE id = NEW.trip_id; END""")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS place_update_trip_version AFTER UPDATE ON place
+        BEGIN UPDATE trip SET version = version + 1 WHERE id IN (OLD.trip_id, NEW.trip_id); END""")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS place_delete_trip_version AFTER DELETE ON place
+        BEGIN UPDATE trip SET version = version + 1 WHERE id = OLD.trip_id; END""")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS place_insert_place_index AFTER INSERT ON place
+        WHEN NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL
+        BEGIN
+            INSERT OR REPLACE INTO place_index (id, min_lat, max_lat, min_lon, max_lon, trip_id)
+            VALUES (NEW.id, NEW.lat, NEW.lat, NEW.lon, NEW.lon, NEW.trip_id);
+        END""")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS place_update_place_index AFTER UPDATE ON place
+        BEGIN
+            DELETE FROM place_index WHERE id = OLD.id;
+            INSERT INTO place_index (id, min_lat, max_lat, min_lon, max_lon, trip_id)
+            SELECT NEW.id, NEW.lat, NEW.lat, NEW.lon, NEW.lon, NEW.trip_id
+            WHERE NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL;
+        END""")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS place_delete_place_index AFTER DELETE ON place
+        BEGIN DELETE FROM place_index WHERE id = OLD.id; END""")
+
+    if legacy_tables:
+        conn.execute("UPDATE trip SET version = version + 1")
+
+
+def _005_place_change_tracking(conn):
+    """Place.version, the trip version of a row's last change, and place_tombstone rows for deleted
+    places, both written by the triggers below, so GET /trips/<trip_id>/changes can answer with
+    only what changed since a client's version. The place_tombstone table comes from create_all().
+    Deletions before this migration left no tombstone: Trip.tracked_since is set to the current
+    version, clients that synced earlier get the whole trip once."""
+    for trigger in ("place_insert_trip_version", "place_update_trip_version", "place_delete_trip_version",
+                    "place_update_place_index"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    _add_column(conn, "place", "version", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "trip", "tracked_since", "INTEGER NOT NULL DEFAULT 0")
+    conn.execute("UPDATE place SET version = COALESCE((SELECT version FROM trip WHERE trip.id = place.trip_id), 0)")
+    conn.execute("UPDATE trip SET tracked_since = version")
+
+    # Setting place.version from these triggers doesn't fire the update triggers, they only watch the data columns
+    data_columns = ", ".join(("category",) + PLACE_COPY_COLUMNS)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS place_insert_trip_version AFTER INSERT ON place
+        BEGIN
+            UPDATE trip SET version = version + 1 WHERE id = NEW.trip_id;
+            UPDATE place SET version = (SELECT version FROM trip WHERE id = NEW.trip_id) WHERE id = NEW.id;
+        END""")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS place_update_trip_version AFTER UPDATE OF {data_columns} ON place
+        BEGIN
+            UPDATE trip SET version = version + 1 WHERE id IN (OLD.trip_id, NEW.trip_id);
+            UPDATE place SET version = (SELECT version FROM trip WHERE id = NEW.trip_id) WHERE id = NEW.id;
+            INSERT INTO place_tombstone (place_id, category, trip_id, version)
+            SELECT OLD.id, OLD.category, OLD.trip_id, version FROM trip
+            WHERE id = OLD.trip_id AND OLD.trip_id IS NOT NEW.trip_id;
+        END""")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS place_delete_trip_version AFTER DELETE ON place
+        BEGIN
+            UPDATE trip SET version = version + 1 WHERE id = OLD.trip_id;
+            INSERT INTO place_tombstone (place_id, category, trip_id, version)
+            SELECT OLD.id, OLD.category, OLD.trip_id, version FROM trip WHERE id = OLD.trip_id;
+        END""")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS place_update_place_index AFTER UPDATE OF lat, lon, trip_id ON place
+        BEGIN
+            DELETE FROM place_index WHERE id = OLD.id;
+            INSERT INTO place_index (id, min_lat, max_lat, min_lon, max_lon, trip_id)
+            SELECT NEW.id, NEW.lat, NEW.lat, NEW.lon, NEW.lon, NEW.trip_id
+            WHERE NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL;
+        END""")
+
+
+def _006_user_role(conn):
+    """User.role, "admin" for the accounts allowed on the admin endpoints. Everyone starts as "user",
+    admins are promoted with `flask set-role`."""
+    _add_column(conn, "user", "role", "VARCHAR NOT NULL DEFAULT 'user'")
+
+
+def _007_trip_created_seq(conn):
+    """Trip.created_seq, the creation order GET /trips pages by (the rowid of a table with a TEXT
+    primary key isn't stable, VACUUM may renumber it). Existing trips are numbered in their current
+    rowid order, new ones get the next number from the trigger below."""
+    _add_column(conn, "trip", "created_seq", "INTEGER")
+    conn.execute("UPDATE trip SET created_seq = rowid WHERE created_seq IS NULL")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_trip_created_seq ON trip (created_seq)")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trip_insert_created_seq AFTER INSERT ON trip WHEN NEW.created_seq IS NULL
+        BEGIN
+            UPDATE trip SET created_seq = (SELECT COALESCE(MAX(created_seq), 0) + 1 FROM trip) WHERE id = NEW.id;
+        END""")
+
+
+def _008_place_version_fallback(conn):
+    """Place.version falls back to 0 like the migration 5 backfill when the place's trip doesn't
+    exist (places left behind by deleted trips), instead of failing the NOT NULL constraint."""
+    for trigger in ("place_insert_trip_version", "place_update_trip_version"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    data_columns = ", ".join(("category",) + PLACE_COPY_COLUMNS)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS place_insert_trip_version AFTER INSERT ON place
+        BEGIN
+            UPDATE trip SET version = version + 1 WHERE id = NEW.trip_id;
+            UPDATE place SET version = COALESCE((SELECT version FROM trip WHERE id = NEW.trip_id), 0)
+            WHERE id = NEW.id;
+        END""")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS place_update_trip_version AFTER UPDATE OF {data_columns} ON place
+        BEGIN
+            UPDATE trip SET version = version + 1 WHERE id IN (OLD.trip_id, NEW.trip_id);
+            UPDATE place SET version = COALESCE((SELECT version FROM trip WHERE id = NEW.trip_id), 0)
+            WHERE id = NEW.id;
+            INSERT INTO place_tombstone (place_id, category, trip_id, version)
+            SELECT OLD.id, OLD.category, OLD.trip_id, version FROM trip
+            WHERE id = OLD.trip_id AND OLD.trip_id IS NOT NEW.trip_id;
+        END""")
+
+
+# (version, migration), in the order they must run
+MIGRATIONS = [
+    (1, _001_trip_version),
+    (2, _002_place_lat_lon_rtree),
+    (3, _003_lookup_indexes),
+    (4, _004_unified_place_table),
+    (5, _005_place_change_tracking),
+    (6, _006_user_role),
+    (7, _007_trip_created_seq),
+    (8, _008_place_version_fallback),
+]
+
+
+def _create_missing_tables(conn):
+    """What db.create_all() does, on the given connection so it runs under the migration lock:
+    create the model tables that don't exist yet together with their indexes (existing tables are
+    left to the migrations)."""
+    existing = _tables(conn)
+    dialect = db.engine.dialect
+    for table in db.metadata.sorted_tables:
+        if table.name in existing:
+            continue
+        conn.execute(str(CreateTable(table).compile(dialect=dialect)))
+        for index in table.indexes:
+            conn.execute(str(CreateIndex(index).compile(dialect=dialect)))
+
+
+def upgrade_database():
+    """Create missing tables and apply pending migrations. Needs an app context.
+    Both run in one write transaction, so workers booting at the same time wait for
+    each other instead of racing on CREATE TABLE.
+
+    Returns:
+        int: The schema version of the database after the upgrade.
+    """
+    raw = db.engine.raw_connection()
+    conn = raw.driver_connection
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # manage the transaction ourselves
+    try:
+        conn.execute("BEGIN IMMEDIATE")  # takes the write lock before reading the version
+        try:
+            _create_missing_tables(conn)
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            for version, migration in MIGRATIONS:
+                if version > current:
+                    migration(conn)
+                    conn.execute(f"PRAGMA user_version = {version}")
+                    current = version
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return current
+    finally:
+        conn.isolation_level = isolation_level
+        raw.close()
@@ -0,0 +1,231 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", os.path.join(basedir, "data", "cache.sqlite"))
+
+# Every cache created in this process, so their counters can be reported together
+_registry = {}
+_local = threading.local()
+
+
+def _connection(path: str) -> sqlite3.Connection:
+    """
+    Return this thread's connection to the cache database.
+    sqlite3 connections can't be shared between threads, so each thread opens its own.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        connections[path] = conn
+    return conn
+
+
+class SQLiteCache:
+    """
+    Small key/value cache stored in a SQLite file, so it survives restarts and
+    is shared by every gunicorn worker. Entries expire after `ttl` seconds and the
+    least recently used ones are evicted once `max_entries` or `max_bytes` is exceeded.
+    Values must be JSON serializable.
+    """
+
+    def __init__(self, name, ttl, max_entries=None, max_bytes=None, path=CACHE_DB_PATH):
+        self.name = name
+        self.table = f"cache_{name}"
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._ready = False
+        _registry[name] = self
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = _connection(self.path)
+        if not self._ready:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{self.table}_accessed ON {self.table} (accessed_at)")
+            self._ready = True
+        return conn
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str):
+        """
+        Return the cached value for key, or None if it is missing or expired.
+        """
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count(hit=False)
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._count(hit=False)
+                return None
+            conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            print(f"Cache '{self.name}' read failed:", str(e))
+            self._count(hit=False)
+            return None
+        self._count(hit=True)
+        return json.loads(value)
+
+    def set(self, key: str, value):
+        """
+        Store value under key and evict expired / least recently used entries.
+        """
+        now = time.time()
+        payload = json.dumps(value, separators=(",", ":"))
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, size, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, payload, len(payload), now, now),
+                )
+                self._evict(conn, now)
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            print(f"Cache '{self.name}' write failed:", str(e))
+
+    def delete(self, key: str):
+        try:
+            self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"Cache '{self.name}' delete failed:", str(e))
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl,))
+        if self.max_entries:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        if self.max_bytes:
+            total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+            if total > self.max_bytes:
+                rows = conn.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed_at").fetchall()
+                stale = []
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    stale.append((key,))
+                    total -= size
+                conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", stale)
+
+    def stats(self) -> dict:
+        """
+        Hit/miss counters of this process plus the current size of the cache.
+        """
+        try:
+            entries, size = self._conn().execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+        except sqlite3.Error:
+            entries, size = None, None
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "entries": entries,
+            "bytes": size,
+            "ttl": self.ttl,
+        }
+
+
+class TTLCache:
+    """
+    In-process cache for small, hot lookups that shouldn't cost a database round trip on
+    every request. Entries expire after `ttl` seconds, the oldest are dropped beyond `max_entries`.
+    Every gunicorn worker has its own copy: delete() only reaches the current process,
+    so `ttl` bounds how long other workers can answer with stale data.
+    """
+
+    def __init__(self, name, ttl, max_entries=10000):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def get(self, key):
+        """
+        Return the cached value for key, or None if it is missing or expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses, entries = self.hits, self.misses, len(self._entries)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "entries": entries,
+            "bytes": None,
+            "ttl": self.ttl,
+        }
+
+
+def cache_stats() -> dict:
+    """
+    Stats of every cache registered in this process, keyed by cache name.
+    """
+    return {name: cache.stats() for name, cache in _registry.items()}
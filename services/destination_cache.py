@@ -0,0 +1,40 @@
+import hashlib
+import json
+import os
+import re
+
+from services.cache import SQLiteCache
+
+# The questionnaire fields sent by the frontend to POST /find-destination
+QUESTIONNAIRE_FIELDS = ("location", "goal", "interests", "length", "type",
+                        "transport", "preferred", "avoid", "season", "acc")
+
+DESTINATION_CACHE_TTL = int(os.getenv("DESTINATION_CACHE_TTL", 30 * 24 * 3600))
+DESTINATION_CACHE_MAX_ENTRIES = int(os.getenv("DESTINATION_CACHE_MAX_ENTRIES", "5000"))
+
+destination_cache = SQLiteCache("destinations", ttl=DESTINATION_CACHE_TTL,
+                                max_entries=DESTINATION_CACHE_MAX_ENTRIES)
+
+
+def _canonical(value):
+    """
+    Case and whitespace insensitive form of an answer. Lists become sorted sets,
+    empty answers all become None.
+    """
+    if isinstance(value, str):
+        value = re.sub(r"\s+", " ", value).strip().lower()
+        return value or None
+    if isinstance(value, (list, tuple, set)):
+        items = {_canonical(v) for v in value}
+        items.discard(None)
+        return sorted(items, key=str) or None
+    return value
+
+
+def questionnaire_key(data: dict) -> str:
+    """
+    Cache key of a questionnaire submission, identical for submissions that only
+    differ in case, whitespace or the order of multiple choice answers.
+    """
+    canonical = {field: _canonical(data.get(field)) for field in QUESTIONNAIRE_FIELDS}
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
@@ -0,0 +1,10 @@
+import os
+
+from services.cache import TTLCache
+
+# Short, because deleting or editing a user only invalidates the cache of the worker that handled it
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "60"))
+IDENTITY_CACHE_MAX_ENTRIES = int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", "10000"))
+
+# user_id -> {"user_id", "username", "email", "role"} of the users behind recently seen JWTs
+identity_cache = TTLCache("identities", ttl=IDENTITY_CACHE_TTL, max_entries=IDENTITY_CACHE_MAX_ENTRIES)
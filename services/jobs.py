@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from services.cache import SQLiteCache
+
+SUGGESTION_WORKERS = int(os.getenv("SUGGESTION_WORKERS", "4"))
+SUGGESTION_QUEUE_SIZE = int(os.getenv("SUGGESTION_QUEUE_SIZE", "32"))
+SUGGESTION_JOB_TTL = int(os.getenv("SUGGESTION_JOB_TTL", "3600"))
+# The process holding a queued or running job refreshes its heartbeat_at every JOB_HEARTBEAT seconds,
+# a job whose heartbeat is older than JOB_STALE_AFTER lost its worker (e.g. a gunicorn restart)
+JOB_HEARTBEAT = float(os.getenv("JOB_HEARTBEAT", "10"))
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "60"))
+
+
+class JobQueueFull(Exception):
+    """
+    Raised by JobPool.submit when every worker is busy and the queue is full.
+    """
+
+
+class JobPool:
+    """
+    Runs slow work on a bounded pool of background threads, so the request that
+    started it can return right away.
+    At most `max_workers` jobs run at the same time and at most `max_queued` more wait
+    for a worker; beyond that submit refuses new jobs instead of piling them up.
+    Job states are kept in the SQLite cache file, so any gunicorn worker can answer
+    a status poll, not only the one running the job. The jobs only run in the process
+    that accepted them: it stores its pid and keeps a heartbeat on them, and a poll
+    reports a job whose heartbeat stopped as failed instead of pending forever.
+    """
+
+    def __init__(self, name, max_workers, max_queued, ttl, heartbeat=JOB_HEARTBEAT, stale_after=JOB_STALE_AFTER):
+        self.name = name
+        self.store = SQLiteCache(f"jobs_{name}", ttl=ttl)
+        self.heartbeat = heartbeat
+        self.stale_after = stale_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-job")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queued)
+        # job_id -> current state of the jobs this process holds, guarded by _lock together
+        # with their writes to the store, so a heartbeat never overwrites a finished job
+        self._active = {}
+        self._lock = threading.Lock()
+        self._heartbeat_pid = None
+
+    def _save(self, job):
+        with self._lock:
+            self._active[job["job_id"]] = job
+            self.store.set(job["job_id"], {**job, "heartbeat_at": time.time()})
+
+    def _start_heartbeat(self):
+        # Started by the first submit of each process, a thread started before gunicorn forks wouldn't run
+        with self._lock:
+            if self._heartbeat_pid == os.getpid():
+                return
+            self._heartbeat_pid = os.getpid()
+        threading.Thread(target=self._beat, name=f"{self.name}-heartbeat", daemon=True).start()
+
+    def _beat(self):
+        while True:
+            time.sleep(self.heartbeat)
+            try:
+                with self._lock:
+                    for job in self._active.values():
+                        self.store.set(job["job_id"], {**job, "heartbeat_at": time.time()})
+            except Exception as e:  # e.g. the cache file stayed locked, try again on the next beat
+                print(f"{self.name} job heartbeat failed:", str(e))
+
+    def submit(self, fn, *args, meta=None, **kwargs) -> str:
+        """
+        Queue fn(*args, **kwargs), which must return a (JSON payload, HTTP status) tuple.
+        `meta` is stored with the job (e.g. its owner) and returned by get.
+        Returns the id of the new job.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFull(f"Too many pending {self.name} jobs")
+        self._start_heartbeat()
+        job_id = uuid.uuid4().hex
+        job = {"job_id": job_id, "status": "queued", "created_at": time.time(), "worker_pid": os.getpid(),
+               **(meta or {})}
+        self._save(job)
+        try:
+            self._executor.submit(self._run, job, fn, args, kwargs)
+        except RuntimeError:
+            with self._lock:
+                self._active.pop(job_id, None)
+            self._slots.release()
+            raise
+        return job_id
+
+    def _run(self, job, fn, args, kwargs):
+        try:
+            self._save({**job, "status": "running", "started_at": time.time()})
+            try:
+                result, status_code = fn(*args, **kwargs)
+            except Exception as e:
+                print(f"Job {job['job_id']} failed:", str(e))
+                result, status_code = {"error": str(e)}, 500
+            with self._lock:
+                self._active.pop(job["job_id"], None)
+                self.store.set(job["job_id"], {
+                    **job,
+                    "status": "done" if status_code < 400 else "failed",
+                    "finished_at": time.time(),
+                    "status_code": status_code,
+                    "result": result,
+                })
+        finally:
+            with self._lock:
+                self._active.pop(job["job_id"], None)
+            self._slots.release()
+
+    def get(self, job_id: str):
+        """
+        Return the stored state of a job, or None if it is unknown or expired.
+        A queued or running job whose heartbeat stopped is returned as failed.
+        """
+        job = self.store.get(job_id)
+        if job and job["status"] in ("queued", "running") \
+                and time.time() - job.get("heartbeat_at", job["created_at"]) > self.stale_after:
+            return {**job, "status": "failed", "status_code": 500,
+                    "result": {"error": "The worker running this job stopped, please retry"}}
+        return job
+
+
+suggestion_jobs = JobPool("suggestions", max_workers=SUGGESTION_WORKERS,
+                          max_queued=SUGGESTION_QUEUE_SIZE, ttl=SUGGESTION_JOB_TTL)
@@ -1,12 +1,53 @@
-from openai import OpenAI
+from openai import OpenAI, DefaultHttpxClient
 from dotenv import load_dotenv
-import os, re
+import httpx
+import os, re, json
+import threading
 
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
 OVERPASS_URL = "https://overpass-api.de/api/interpreter"
 UA = {"User-Agent": "osm-query-from-form/1.0"}
 
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", "20"))
+
+# Read timeouts per call, the selection prompt carries the largest input
+SELECTION_TIMEOUT = httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+DESTINATION_TIMEOUT = httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+TIPS_TIMEOUT = httpx.Timeout(45, connect=OPENAI_CONNECT_TIMEOUT)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_openai_client() -> OpenAI:
+    """
+    Process-wide OpenAI client, created on first use.
+    It keeps its httpx connection pool alive between requests and is safe
+    to share between worker threads.
+    """
+    global _client
+    if not api_key:
+        raise RuntimeError("Set OPENAI_API_KEY in your environment.")
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = DefaultHttpxClient(
+                    limits=httpx.Limits(max_connections=OPENAI_POOL_SIZE,
+                                        max_keepalive_connections=OPENAI_POOL_SIZE,
+                                        keepalive_expiry=60),
+                )
+                _client = OpenAI(
+                    api_key=api_key,
+                    http_client=http_client,
+                    max_retries=OPENAI_MAX_RETRIES,
+                    timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+                )
+    return _client
+
 
 def get_selection_via_openai(user_request, elements):
     SYSTEM_PROMPT = """
@@ -90,12 +131,10 @@ def get_selection_via_openai(user_request, elements):
     ]
     """
 
-    if not api_key:
-        raise RuntimeError("Set OPENAI_API_KEY in your environment.")
-
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client()
 
-    user_block = f"User request:\n{user_request}\n\nElements:\n{elements}"
+    # Compact JSON instead of the Python repr, fewer tokens for the same content
+    user_block = f"User request:\n{json.dumps(user_request)}\n\nElements:\n{json.dumps(elements, separators=(',', ':'))}"
 
     response = client.chat.completions.create(
         model="gpt-4o-mini",
@@ -103,7 +142,8 @@ def get_selection_via_openai(user_request, elements):
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": user_block},
         ],
-        temperature=0
+        temperature=0,
+        timeout=SELECTION_TIMEOUT
     )
 
     text = response.choices[0].message.content.strip()
@@ -112,7 +152,7 @@ def get_selection_via_openai(user_request, elements):
     return text
 
 
-def get_destination_suggestion(location, goal, interests, fame, length, transport, preferred, avoid, season, acc):
+def _destination_messages(location, goal, interests, fame, length, transport, preferred, avoid, season, acc):
     system_prompt = """
         You are an intelligent travel destination suggestor. 
         Your goal is to recommend 5 specific destinations that best match the user's preferences.
@@ -157,19 +197,21 @@ def get_destination_suggestion(location, goal, interests, fame, length, transpor
     
         Please suggest 5 travel destinations that fit this profile."""
 
-    if not api_key:
-        raise RuntimeError("Set OPENAI_API_KEY in your environment.")
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
 
-    client = OpenAI(api_key=api_key)
 
+def get_destination_suggestion(location, goal, interests, fame, length, transport, preferred, avoid, season, acc):
+    client = get_openai_client()
 
     response = client.chat.completions.create(
         model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        temperature=0
+        messages=_destination_messages(location, goal, interests, fame, length, transport, preferred, avoid,
+                                       season, acc),
+        temperature=0,
+        timeout=DESTINATION_TIMEOUT
     )
 
     text_content = response.choices[0].message.content.strip()
@@ -178,14 +220,21 @@ def get_destination_suggestion(location, goal, interests, fame, length, transpor
     return text_content
 
 
-def get_openai_tips(elements):
-    SYSTEM_PROMPT = """
+def _tips_messages(elements, region_tips=None):
+    # The general tips of the region are shared between trips, only the trip specific part is generated
+    if region_tips:
+        task = ("The traveller already received general tips about the region, listed with the elements. "
+                "Return only 2 to 4 additional tips about the given places, don't repeat the general ones.")
+    else:
+        task = "Return 5 to 10 thoughtful and useful tips, tailored to the region the traveller is visiting."
+
+    SYSTEM_PROMPT = f"""
         You are an intelligent travel advisor. Your job is to return tips for trip based on a given list 
         of elements, which are places the traveller intends to visit.
-        Return 5 to 10 thoughtful and useful tips, tailored to the region the traveller is visiting.
+        {task}
         Add a couple of emojis in the returned text.
         Return your answer in valid JSON format like this:
-        { 
+        {{ 
             "tips": [
             "Not many people speak English...", 
             "Try the dish .... at the restaurant ...",
@@ -193,26 +242,106 @@ def get_openai_tips(elements):
             "Don't forget to bring...",
             "Some places can be dangerous for tourists, hire a guide, etc ☂️" 
             ]
-        },
+        }},
         """
 
-    if not api_key:
-        raise RuntimeError("Set OPENAI_API_KEY in your environment.")
+    user_block = f"Elements:\n{elements}"
+    if region_tips:
+        user_block += "\n\nGeneral tips already given:\n" + json.dumps(region_tips, ensure_ascii=False)
+
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_block},
+    ]
 
-    client = OpenAI(api_key=api_key)
 
-    user_block = f"Elements:\n{elements}"
+def _region_tips_messages(lat, lon):
+    SYSTEM_PROMPT = """
+        You are an intelligent travel advisor. Your job is to return general tips for travellers visiting
+        the region around the given coordinates (about 40 km across): the city or area it is in, local customs,
+        food, transport, safety, seasons and events.
+        Return 5 to 8 thoughtful and useful tips that are true for any trip to this region,
+        don't refer to specific hotels, restaurants or other businesses.
+        Add a couple of emojis in the returned text.
+        Return your answer in valid JSON format like this:
+        { 
+            "tips": [
+            "Not many people speak English...", 
+            "If you are travelling in may, there is a festival that happens...",
+            "Don't forget to bring..."
+            ]
+        }
+        """
+
+    user_block = f"Region centre: lat {lat}, lon {lon}"
+
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_block},
+    ]
+
+
+def get_openai_tips(elements, region_tips=None):
+    client = get_openai_client()
 
     response = client.chat.completions.create(
         model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user_block},
-        ],
-        temperature=0
+        messages=_tips_messages(elements, region_tips),
+        temperature=0,
+        timeout=TIPS_TIMEOUT
     )
 
     text_content = response.choices[0].message.content.strip()
     # strip accidental code fences if any
     text_content = re.sub(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$", "", text_content)
-    return text_content
\ No newline at end of file
+    return text_content
+
+
+def get_openai_region_tips(lat, lon):
+    client = get_openai_client()
+
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=_region_tips_messages(lat, lon),
+        temperature=0,
+        timeout=TIPS_TIMEOUT
+    )
+
+    text_content = response.choices[0].message.content.strip()
+    # strip accidental code fences if any
+    text_content = re.sub(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$", "", text_content)
+    return text_content
+
+
+def _stream_completion(messages, timeout):
+    """
+    Yield the text deltas of a streamed completion as they arrive.
+    """
+    client = get_openai_client()
+
+    stream = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        temperature=0,
+        stream=True,
+        timeout=timeout
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def stream_destination_suggestion(location, goal, interests, fame, length, transport, preferred, avoid, season, acc):
+    """
+    Streaming variant of get_destination_suggestion, yields the raw text deltas.
+    """
+    messages = _destination_messages(location, goal, interests, fame, length, transport, preferred, avoid,
+                                     season, acc)
+    yield from _stream_completion(messages, DESTINATION_TIMEOUT)
+
+
+def stream_openai_tips(elements, region_tips=None):
+    """
+    Streaming variant of get_openai_tips, yields the raw text deltas.
+    """
+    yield from _stream_completion(_tips_messages(elements, region_tips), TIPS_TIMEOUT)
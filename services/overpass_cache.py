@@ -0,0 +1,97 @@
+import hashlib
+import json
+import math
+import os
+
+from services.cache import SQLiteCache
+
+# Lat/lon are snapped to a grid of this many degrees (~220 m of latitude),
+# so searches a few metres apart share one cache entry.
+GRID_DEGREES = float(os.getenv("OVERPASS_CACHE_GRID", "0.002"))
+
+# The radius is rounded up to the next bucket. Larger than any bucket -> next multiple of 5 km.
+RADIUS_BUCKETS = (250, 500, 750, 1000, 1500, 2000, 2500, 3000, 4000, 5000, 7500, 10000)
+# Farthest a centre can move when snapped: half the diagonal of a grid cell (at the equator, the widest).
+# Every radius is widened by this much, not by the actual move, so the bucket only depends on the radius
+# and a centre exactly on a grid point shares the bucket of one a few metres away.
+MAX_SNAP_OFFSET_M = GRID_DEGREES / 2 * 111320 * math.sqrt(2)
+# Upper bound of the factor the `out` limit of a query grows by with its bucket (see limit_scale)
+MAX_LIMIT_SCALE = 4.0
+
+OVERPASS_CACHE_TTL = int(os.getenv("OVERPASS_CACHE_TTL", 7 * 24 * 3600))  # OSM POIs change slowly
+OVERPASS_CACHE_MAX_BYTES = int(os.getenv("OVERPASS_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+
+overpass_cache = SQLiteCache("overpass", ttl=OVERPASS_CACHE_TTL, max_bytes=OVERPASS_CACHE_MAX_BYTES)
+
+
+def _normalize_filter(value):
+    if isinstance(value, (list, tuple, set)):
+        return sorted({str(v).strip().lower() for v in value if str(v).strip()})
+    if isinstance(value, str):
+        return value.strip().lower()
+    return value
+
+
+def normalize_filters(filters: dict) -> dict:
+    """
+    Lower-case, strip and sort filter values and drop the empty ones.
+    """
+    return {k: _normalize_filter(v) for k, v in sorted(filters.items()) if v not in (None, "", [])}
+
+
+def _radius_bucket(radius: float) -> int:
+    for bucket in RADIUS_BUCKETS:
+        if radius <= bucket:
+            return bucket
+    return int(math.ceil(radius / 5000) * 5000)
+
+
+def _previous_bucket(bucket: int) -> int:
+    if bucket in RADIUS_BUCKETS:
+        index = RADIUS_BUCKETS.index(bucket)
+        return RADIUS_BUCKETS[index - 1] if index else 0
+    return max(bucket - 5000, RADIUS_BUCKETS[-1])
+
+
+def limit_scale(bucket: int) -> float:
+    """
+    Factor for the `out` limit of a query covering a bucket's circle. The caller cuts the
+    original circle out of the results, which can be as small as the smallest radius mapped
+    to the bucket, so the limit grows by the area ratio to keep as many candidates inside it.
+    Only depends on the bucket, so every search sharing a cache entry sends the same query.
+    """
+    smallest = max(_previous_bucket(bucket) - MAX_SNAP_OFFSET_M, 1.0)
+    return min((bucket / smallest) ** 2, MAX_LIMIT_SCALE)
+
+
+def normalize_request(category: str, filters: dict, lat, lon, radius):
+    """
+    Normalize a suggestions search so that equivalent searches map to the same cache entry.
+
+    lat/lon are snapped to the grid and the radius is widened to the bucket that still
+    covers the original circle around the snapped point, so the Overpass query has to be
+    built with the returned values (the caller cuts the original circle out afterwards),
+    its `out` limit multiplied by the returned scale.
+
+    Returns:
+        tuple: (cache_key, lat, lon, radius, limit_scale) with the snapped query parameters.
+
+    Raises:
+        ValueError: If lat, lon or radius are not numbers.
+    """
+    lat, lon, radius = float(lat), float(lon), float(radius)
+
+    snapped_lat = round(round(lat / GRID_DEGREES) * GRID_DEGREES, 6)
+    snapped_lon = round(round(lon / GRID_DEGREES) * GRID_DEGREES, 6)
+    bucket = _radius_bucket(radius + MAX_SNAP_OFFSET_M)
+
+    normalized = {
+        "category": category,
+        "filters": normalize_filters(filters),
+        "lat": snapped_lat,
+        "lon": snapped_lon,
+        "radius": bucket,
+        "limit_scale": round(limit_scale(bucket), 3),  # results fetched with other limits aren't reused
+    }
+    digest = hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+    return digest, snapped_lat, snapped_lon, bucket, limit_scale(bucket)
@@ -0,0 +1,108 @@
+"""
+Small compiler from declarative selectors to Overpass QL.
+
+A selector is (element types, filters): types is any of "n", "w", "r" combined
+(e.g. "nwr", "wr"), filters a tuple of (key, op, value) with op one of
+"exists", "=", "~" (regex) or "~i" (case insensitive regex).
+
+Compiling deduplicates selectors, merges selectors that only differ in their types
+(node/way/relation triples become one `nwr` statement) or in the value of one
+`=` filter (`[stars=4]` + `[stars=5]` -> `[stars~"^(4|5)$"]`), and memoizes the
+resulting template so repeated searches only substitute the area.
+"""
+import math
+import re
+from functools import lru_cache
+
+TYPE_ORDER = "nwr"
+# Overpass only accepts the one-letter forms combined (nw, wr, nr, nwr), a single type is spelled out
+SINGLE_TYPES = {"n": "node", "w": "way", "r": "rel"}
+QUERY_TIMEOUT = 180
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _render_filter(key, op, value) -> str:
+    if op == "exists":
+        return f'["{key}"]'
+    if op == "~i":
+        return f'["{key}"~"{_escape(value)}",i]'
+    return f'["{key}"{op}"{_escape(value)}"]'
+
+
+def _types_string(types) -> str:
+    letters = "".join(t for t in TYPE_ORDER if t in types)
+    return SINGLE_TYPES.get(letters, letters)
+
+
+def merge_selectors(selectors):
+    """
+    Deduplicate and merge selectors, keeping the order of their first appearance.
+    """
+    # Same filters -> one statement for all element types
+    by_filters = {}
+    for types, filters in selectors:
+        by_filters.setdefault(tuple(filters), set()).update(types)
+    merged = [(_types_string(types), filters) for filters, types in by_filters.items()]
+
+    # Same types and filters except the value of one "=" filter -> one regex filter
+    groups = {}
+    for index, (types, filters) in enumerate(merged):
+        for position, (key, op, value) in enumerate(filters):
+            if op == "=":
+                rest = filters[:position] + filters[position + 1:]
+                groups.setdefault((types, rest, key), []).append((index, position, value))
+
+    result = list(merged)
+    consumed = set()
+    for (types, rest, key), members in groups.items():
+        members = [m for m in members if m[0] not in consumed]
+        if len(members) < 2:
+            continue
+        first_index, position, _ = members[0]
+        values = "|".join(re.escape(value) for _, _, value in members)
+        filters = rest[:position] + ((key, "~", f"^({values})$"),) + rest[position:]
+        result[first_index] = (types, filters)
+        consumed.update(index for index, _, _ in members)
+        for index, _, _ in members[1:]:
+            result[index] = None
+    return [selector for selector in result if selector is not None]
+
+
+@lru_cache(maxsize=256)
+def compile_template(selectors: tuple, limit: int, bbox_mode: bool) -> str:
+    """
+    Overpass QL for the selectors with an `{area}` placeholder.
+
+    Around queries repeat the one area filter on every statement. For bbox queries
+    (tiles) the box becomes the global [bbox:...] setting shared by all statements,
+    and the output has no limit because stored tiles must be complete.
+    """
+    merged = merge_selectors(selectors)
+    if bbox_mode:
+        header = f"[out:json][timeout:{QUERY_TIMEOUT}][bbox:{{area}}];"
+        area_filter = ""
+        out = "out center;"
+    else:
+        header = f"[out:json][timeout:{QUERY_TIMEOUT}];"
+        area_filter = "({area})"
+        out = f"out center {limit};"
+    statements = "".join(
+        f"{types}{''.join(_render_filter(*f) for f in filters)}{area_filter};" for types, filters in merged)
+    return f"{header}({statements});{out}"
+
+
+def compile_query(selectors, lat, lon, radius, limit: int, bbox=None, limit_scale: float = 1.0) -> str:
+    """
+    Build the query for the selectors around lat/lon, or inside bbox (south, west, north, east).
+    limit_scale multiplies the `out` limit of around queries (see overpass_cache.limit_scale).
+    """
+    selectors = tuple((types, tuple(filters)) for types, filters in selectors)
+    limit = int(math.ceil(limit * limit_scale))
+    if bbox:
+        area = ",".join(str(round(v, 7)) for v in bbox)
+    else:
+        area = f"around:{radius},{lat},{lon}"
+    return compile_template(selectors, limit, bool(bbox)).replace("{area}", area)
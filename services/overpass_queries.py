@@ -1,75 +1,82 @@
 # QUERIES
-from typing import List
-
-
-def query_places_explore_outdoor(lat: float, lon: float, radius: int) -> str:
+from typing import List, Optional, Tuple
+
+from services.overpass_compiler import compile_query
+
+# (south, west, north, east) in degrees, the order Overpass expects in a bbox filter
+BBox = Tuple[float, float, float, float]
+
+# Declarative category specs: lists of (element types, ((key, op, value), ...)) selectors,
+# compiled (deduplicated, merged into nwr statements, memoized) by services/overpass_compiler.py
+NAME = ("name", "exists", None)
+
+EXPLORE_OUTDOOR = [
+    ("nwr", (("natural", "~", "water|lake|spring|forest"), NAME)),
+    ("nwr", (("leisure", "~", "park|garden|nature_reserve"), NAME)),
+    ("nwr", (("tourism", "~", "attraction|viewpoint|picnic_site|theme_park"), NAME)),
+    ("w", (("highway", "=", "path"), ("foot", "=", "designated"), NAME)),
+    ("r", (("route", "=", "hiking"), NAME)),
+]
+
+EXPLORE_INDOOR = [
+    ("nwr", (("tourism", "~", "museum|theatre"), NAME)),
+    ("nwr", (("amenity", "=", "library"), ("tourism", "=", "attraction"), NAME)),
+    ("nwr", (("amenity", "=", "library"), ("heritage", "exists", None), NAME)),
+    ("nwr", (("building", "=", "church"), ("historic", "exists", None))),
+    ("nwr", (("historic", "exists", None), NAME)),
+]
+
+STAYS = {
+    "camping": [("nwr", (("tourism", "=", "camp_site"),)), ("nwr", (("tourism", "=", "caravan_site"),))],
+    "hostel": [("nwr", (("tourism", "=", "hostel"),))],
+    "budget": [("nwr", (("tourism", "=", "hotel"), ("stars", "~", "^[0-2]$")))],
+    "midrange": [("nwr", (("tourism", "=", "hotel"), ("stars", "=", "3"))),
+                 ("nwr", (("tourism", "=", "hotel"), ("stars", "=", "4")))],
+    "luxury": [("nwr", (("tourism", "=", "hotel"), ("stars", "=", "4"))),
+               ("nwr", (("tourism", "=", "hotel"), ("stars", "=", "5"))),
+               ("nwr", (("tourism", "=", "resort"),))],
+    "bnb": [("nwr", (("tourism", "=", "guest_house"),)), ("nwr", (("tourism", "=", "bed_and_breakfast"),))],
+    "allinclusive": [("nwr", (("tourism", "=", "resort"),))],
+}
+
+EAT_DRINK_AMENITY = ("amenity", "~", "^(restaurant|cafe|bar|fast_food)$")
+
+ESSENTIALS = {
+    "supermarket": [("nwr", (("shop", "=", "supermarket"), NAME))],
+    "pharmacy": [("nwr", (("amenity", "=", "pharmacy"), NAME))],
+    "atm": [("nwr", (("amenity", "=", "atm"), NAME))],
+    "hospital": [("nwr", (("amenity", "=", "hospital"), NAME))],
+    "other": [("nwr", (("shop", "~i", "^(convenience|general|kiosk|variety_store)$"), NAME)),
+              ("nwr", (("amenity", "~i", "^(toilets|bank|post_office|bureau_de_change|clinic|fuel)$"), NAME))],
+}
+
+GETTING_AROUND = {
+    "train": [("nwr", (("railway", "=", "station"), NAME))],
+    "bus": [("nwr", (("highway", "=", "bus_stop"), NAME))],
+    "parking": [("nwr", (("amenity", "=", "parking"), NAME))],
+    "bike": [("nwr", (("amenity", "=", "bicycle_rental"), NAME))],
+    "charging": [("nwr", (("amenity", "=", "charging_station"), NAME))],
+    "car": [("nwr", (("amenity", "=", "car_rental"), NAME))],
+}
+
+
+def query_places_explore_outdoor(lat: float, lon: float, radius: int, bbox: Optional[BBox] = None,
+                                 limit_scale: float = 1.0) -> str:
     """
     Build a single Overpass query string for all outdoor categories:
     natural, leisure, tourism, hiking.
     This combines all categories safely with 'out center' and timeout.
     """
-    natural_q = (
-        f'node["natural"~"water|lake|spring|forest"]["name"](around:{radius},{lat},{lon});'
-        f'way["natural"~"water|lake|spring|forest"]["name"](around:{radius},{lat},{lon});'
-        f'relation["natural"~"water|lake|spring|forest"]["name"](around:{radius},{lat},{lon});'
-    )
-
-    leisure_q = (
-        f'node["leisure"~"park|garden|nature_reserve"]["name"](around:{radius},{lat},{lon});'
-        f'way["leisure"~"park|garden|nature_reserve"]["name"](around:{radius},{lat},{lon});'
-        f'relation["leisure"~"park|garden|nature_reserve"]["name"](around:{radius},{lat},{lon});'
-    )
+    return compile_query(EXPLORE_OUTDOOR, lat, lon, radius, limit=200, bbox=bbox, limit_scale=limit_scale)
 
-    tourism_q = (
-        f'node["tourism"~"attraction|viewpoint|picnic_site|theme_park"]["name"](around:{radius},{lat},{lon});'
-        f'way["tourism"~"attraction|viewpoint|picnic_site|theme_park"]["name"](around:{radius},{lat},{lon});'
-        f'relation["tourism"~"attraction|viewpoint|picnic_site|theme_park"]["name"](around:{radius},{lat},{lon});'
-    )
 
-    hiking_q = (
-        f'way["highway"="path"]["foot"="designated"]["name"](around:{radius},{lat},{lon});'
-        f'relation["route"="hiking"]["name"](around:{radius},{lat},{lon});'
-    )
+def query_places_explore_indoor(lat: float, lon: float, radius: int, bbox: Optional[BBox] = None,
+                                limit_scale: float = 1.0) -> str:
+    return compile_query(EXPLORE_INDOOR, lat, lon, radius, limit=200, bbox=bbox, limit_scale=limit_scale)
 
-    # Combine all queries into one
-    combined_elements = "\n".join([natural_q, leisure_q, tourism_q, hiking_q])
 
-    # Build final query string with timeout and optimized output
-    final_query = f""" [out:json][timeout:180]; ({combined_elements}); out center 200;
-    """
-
-    return final_query
-
-
-
-def query_places_explore_indoor(lat: float, lon: float, radius: int) -> str:
-    return f"""
-        [out:json][timeout:180];
-        (
-          node["tourism"~"museum|theatre"][name](around:{radius},{lat},{lon});
-          way["tourism"~"museum|theatre"][name](around:{radius},{lat},{lon});
-          relation["tourism"~"museum|theatre"][name](around:{radius},{lat},{lon});
-        
-          node["amenity"="library"]["tourism"="attraction"][name](around:{radius},{lat},{lon});
-          way["amenity"="library"]["tourism"="attraction"][name](around:{radius},{lat},{lon});
-          relation["amenity"="library"]["tourism"="attraction"][name](around:{radius},{lat},{lon});
-          node["amenity"="library"]["heritage"][name](around:{radius},{lat},{lon});
-          way["amenity"="library"]["heritage"][name](around:{radius},{lat},{lon});
-          relation["amenity"="library"]["heritage"][name](around:{radius},{lat},{lon});
-        
-          node["building"="church"]["historic"](around:{radius},{lat},{lon});
-          way["building"="church"]["historic"](around:{radius},{lat},{lon});
-          relation["building"="church"]["historic"](around:{radius},{lat},{lon});
-        
-          node["historic"][name](around:{radius},{lat},{lon});
-          way["historic"][name](around:{radius},{lat},{lon});
-          relation["historic"][name](around:{radius},{lat},{lon});
-        );
-        out center 200;
-        """
-
-
-def query_stays(lat: float, lon: float, radius: int, styles: List[str]) -> str:
+def query_stays(lat: float, lon: float, radius: int, styles: List[str], bbox: Optional[BBox] = None,
+                limit_scale: float = 1.0) -> str:
     """
     styles: list of stay styles (can be multiple):
         ["Camping", "Hostel", "Budget Hotel", "Mid-range Hotel", "Luxury Hotel", "B&B", "All-inclusive"]
@@ -86,144 +93,42 @@ def query_stays(lat: float, lon: float, radius: int, styles: List[str]) -> str:
         "All-inclusive": "allinclusive"
     }
 
-    queries = {
-        "camping": """
-            node[tourism=camp_site];
-            way[tourism=camp_site];
-            relation[tourism=camp_site];
-            node[tourism=caravan_site];
-            way[tourism=caravan_site];
-            relation[tourism=caravan_site];
-        """,
-        "hostel": """node[tourism=hostel]; way[tourism=hostel]; relation[tourism=hostel];""",
-        "budget": """
-            node[tourism=hotel][stars~"^[0-2]$"];
-            way[tourism=hotel][stars~"^[0-2]$"];
-            relation[tourism=hotel][stars~"^[0-2]$"];
-        """,
-        "midrange": """
-            node[tourism=hotel][stars=3];
-            way[tourism=hotel][stars=3];
-            relation[tourism=hotel][stars=3];
-            node[tourism=hotel][stars=4];
-            way[tourism=hotel][stars=4];
-            relation[tourism=hotel][stars=4];
-        """,
-        "luxury": """
-            node[tourism=hotel][stars=4];
-            way[tourism=hotel][stars=4];
-            relation[tourism=hotel][stars=4];
-            node[tourism=hotel][stars=5];
-            way[tourism=hotel][stars=5];
-            relation[tourism=hotel][stars=5];
-            node[tourism=resort];
-            way[tourism=resort];
-            relation[tourism=resort];
-        """,
-        "bnb": """
-            node[tourism=guest_house];
-            way[tourism=guest_house];
-            relation[tourism=guest_house];
-            node[tourism=bed_and_breakfast];
-            way[tourism=bed_and_breakfast];
-            relation[tourism=bed_and_breakfast];
-        """,
-        "allinclusive": """
-            node[tourism=resort];
-            way[tourism=resort];
-            relation[tourism=resort];
-        """
-    }
-
     # Normalize frontend names to internal keys
     normalized_styles = [name_map[s] for s in styles if s in name_map]
 
     if not normalized_styles:
         raise ValueError("No valid stay styles provided")
 
-    # Combine selected queries
-    combined_query = ""
-    for style in normalized_styles:
-        combined_query += queries[style]
-
-    # Replace ; with the around syntax
-    combined_query = combined_query.replace(';', f'(around:{radius},{lat},{lon});')
-
-    # Wrap with Overpass JSON output and timeout
-    return f"[out:json][timeout:180];({combined_query});out center 100;"
+    # Combine selected specs, duplicates (e.g. 4 stars in midrange and luxury) are merged by the compiler
+    selectors = [selector for style in normalized_styles for selector in STAYS[style]]
+    return compile_query(selectors, lat, lon, radius, limit=100, bbox=bbox, limit_scale=limit_scale)
 
 
-def query_eat_drink(lat: float, lon: float, radius: int, cuisine: str = ".*") -> str:
+def query_eat_drink(lat: float, lon: float, radius: int, cuisine: str = ".*", bbox: Optional[BBox] = None,
+                    limit_scale: float = 1.0) -> str:
     if cuisine:
-        return f"""
-            [out:json][timeout:180];
-            (
-              node[amenity~"^(restaurant|cafe|bar|fast_food)$"][cuisine~"{cuisine}",i](around:{radius},{lat},{lon});
-              way[amenity~"^(restaurant|cafe|bar|fast_food)$"][cuisine~"{cuisine}",i](around:{radius},{lat},{lon});
-              relation[amenity~"^(restaurant|cafe|bar|fast_food)$"][cuisine~"{cuisine}",i](around:{radius},{lat},{lon});
-            );
-            out center 100;
-            """
-    return f"""
-            [out:json][timeout:180];
-            (
-              node[amenity~"^(restaurant|cafe|bar|fast_food)$"](around:{radius},{lat},{lon});
-              way[amenity~"^(restaurant|cafe|bar|fast_food)$"](around:{radius},{lat},{lon});
-              relation[amenity~"^(restaurant|cafe|bar|fast_food)$"](around:{radius},{lat},{lon});
-            );
-            out center 100;
-            """
+        selectors = [("nwr", (EAT_DRINK_AMENITY, ("cuisine", "~i", cuisine)))]
+    else:
+        selectors = [("nwr", (EAT_DRINK_AMENITY,))]
+    return compile_query(selectors, lat, lon, radius, limit=100, bbox=bbox, limit_scale=limit_scale)
 
 
-def query_essentials(lat: float, lon: float, radius: int, ess_type: str) -> str:
+def query_essentials(lat: float, lon: float, radius: int, ess_type: str, bbox: Optional[BBox] = None,
+                     limit_scale: float = 1.0) -> str:
     """
     ess_type: one of ['supermarket', 'pharmacy', 'atm', 'hospital', 'convenience', 'other']
     """
-    queries = {
-        "supermarket": """
-            node[shop=supermarket][name];
-            way[shop=supermarket][name];
-            relation[shop=supermarket][name];
-        """,
-        "pharmacy": """
-            node[amenity=pharmacy][name];
-            way[amenity=pharmacy][name];
-            relation[amenity=pharmacy][name];
-        """,
-        "atm": """
-            node[amenity=atm][name];
-            way[amenity=atm][name];
-            relation[amenity=atm][name];
-        """,
-        "hospital": """
-            node[amenity=hospital][name];
-            way[amenity=hospital][name];
-            relation[amenity=hospital][name];
-        """,
-        "other": """
-            node[shop~"^(convenience|general|kiosk|variety_store)$",i][name];
-            way[shop~"^(convenience|general|kiosk|variety_store)$",i][name];
-            relation[shop~"^(convenience|general|kiosk|variety_store)$",i][name];
-            node[amenity~"^(toilets|bank|post_office|bureau_de_change|clinic|fuel)$",i][name];
-            way[amenity~"^(toilets|bank|post_office|bureau_de_change|clinic|fuel)$",i][name];
-            relation[amenity~"^(toilets|bank|post_office|bureau_de_change|clinic|fuel)$",i][name];
-        """
-    }
-
     # Normalize type to lowercase
     ess_type = ess_type.lower()
 
-    if ess_type not in queries:
+    if ess_type not in ESSENTIALS:
         raise ValueError(f"Invalid essentials type: {ess_type}")
 
-    # Replace radius/lat/lon in query
-    query_body = queries[ess_type].replace(';', f'(around:{radius},{lat},{lon});')
-
-    return f"[out:json][timeout:180];({query_body});out center 100;"
+    return compile_query(ESSENTIALS[ess_type], lat, lon, radius, limit=100, bbox=bbox, limit_scale=limit_scale)
 
 
-
-def query_getting_around(lat: float, lon: float, radius: int, around_types: list) -> str:
+def query_getting_around(lat: float, lon: float, radius: int, around_types: list, bbox: Optional[BBox] = None,
+                         limit_scale: float = 1.0) -> str:
     """
     around_types: list of human-readable types from frontend, e.g.,
     ["Train stations", "Bus stops", "Parking spots", "Bike rentals", "Charging Stations", "Car rental"]
@@ -238,51 +143,11 @@ def query_getting_around(lat: float, lon: float, radius: int, around_types: list
         "Car rental": "car"
     }
 
-    queries = {
-        "train": """
-            node[railway=station][name];
-            way[railway=station][name];
-            relation[railway=station][name];
-        """,
-        "bus": """
-            node[highway=bus_stop][name];
-            way[highway=bus_stop][name];
-            relation[highway=bus_stop][name];
-        """,
-        "parking": """
-            node[amenity=parking][name];
-            way[amenity=parking][name];
-            relation[amenity=parking][name];
-        """,
-        "bike": """
-            node[amenity=bicycle_rental][name];
-            way[amenity=bicycle_rental][name];
-            relation[amenity=bicycle_rental][name];
-        """,
-        "charging": """
-            node[amenity=charging_station][name];
-            way[amenity=charging_station][name];
-            relation[amenity=charging_station][name];
-        """,
-        "car": """
-            node[amenity=car_rental][name];
-            way[amenity=car_rental][name];
-            relation[amenity=car_rental][name];
-        """
-    }
-
     # Normalize frontend names to internal keys
     normalized_types = [name_map[t] for t in around_types if t in name_map]
 
     if not normalized_types:
         raise ValueError("No valid getting around types provided")
 
-    # Combine selected queries
-    combined_query = ""
-    for t in normalized_types:
-        combined_query += queries[t]
-
-    # Replace ; with the around syntax
-    combined_query = combined_query.replace(";", f"(around:{radius},{lat},{lon});")
-
-    return f"[out:json][timeout:180];({combined_query});out center 100;"
+    selectors = [selector for t in normalized_types for selector in GETTING_AROUND[t]]
+    return compile_query(selectors, lat, lon, radius, limit=100, bbox=bbox, limit_scale=limit_scale)
@@ -1,23 +1,225 @@
+import codecs
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from services.overpass_cache import overpass_cache
+from services.streaming import JSONArrayItemStream
 
-OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+DEFAULT_OVERPASS_URLS = (
+    "https://overpass-api.de/api/interpreter",
+    "https://overpass.kumi.systems/api/interpreter",
+    "https://overpass.private.coffee/api/interpreter",
+)
+# Comma separated list of mirrors, tried in order when one is down or rate limiting
+OVERPASS_URLS = [url.strip() for url in os.getenv("OVERPASS_URLS", ",".join(DEFAULT_OVERPASS_URLS)).split(",")
+                 if url.strip()]
+OVERPASS_URL = OVERPASS_URLS[0]
 UA = {"User-Agent": "osm-query-from-form/1.0"}
 
+CONNECT_TIMEOUT = float(os.getenv("OVERPASS_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("OVERPASS_READ_TIMEOUT", "60"))
+# Upper bound for one fetch including retries and failover, so a worker is never stuck for minutes
+TOTAL_TIMEOUT = float(os.getenv("OVERPASS_TOTAL_TIMEOUT", "90"))
+MAX_RETRIES = int(os.getenv("OVERPASS_MAX_RETRIES", "2"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 8.0
+RETRY_STATUSES = {429, 502, 503, 504}
+
+# Parse responses incrementally and keep only usable elements, instead of res.json() on the whole body
+OVERPASS_STREAM_PARSE = os.getenv("OVERPASS_STREAM_PARSE", "1") == "1"
+# Stop reading once this many elements were kept (0 = no limit)
+OVERPASS_MAX_ELEMENTS = int(os.getenv("OVERPASS_MAX_ELEMENTS", "500"))
+STREAM_CHUNK_SIZE = 64 * 1024
+# Fetches started with submit_fetch run here, one thread per pooled mirror connection
+OVERPASS_FETCH_WORKERS = int(os.getenv("OVERPASS_FETCH_WORKERS", "10"))
 
-def fetch_overpass_results(query: str) -> dict:
+_session = None
+_session_lock = threading.Lock()
+_preferred_mirror = 0  # index of the last mirror that answered, tried first next time
+_fetch_pool = ThreadPoolExecutor(max_workers=OVERPASS_FETCH_WORKERS, thread_name_prefix="overpass-fetch")
+
+
+def get_session() -> requests.Session:
     """
-    Send a query to Overpass API and return the JSON result.
-    Handles request errors and timeouts.
+    Process-wide session, so connections to the mirrors are pooled and kept alive
+    instead of paying a new TCP + TLS handshake on every search.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=len(OVERPASS_URLS), pool_maxsize=OVERPASS_FETCH_WORKERS,
+                                      max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update(UA)
+                _session = session
+    return _session
+
+
+def _backoff(attempt: int, retry_after=None) -> float:
+    """
+    Full-jitter exponential backoff, or the server's Retry-After when it sent one.
+    """
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def request_overpass(query: str, stream: bool = False):
+    """
+    POST the query to the Overpass mirrors with failover and bounded retries.
+
+    Every round tries each mirror once, starting with the last one that answered.
+    Connection errors, timeouts and 429/502/503/504 move on to the next mirror; when all
+    of them failed the round is retried after a jittered backoff, up to MAX_RETRIES times.
+
+    Returns:
+        tuple: (response, None) on success or (None, error message).
+    """
+    global _preferred_mirror
+    session = get_session()
+    deadline = time.monotonic() + TOTAL_TIMEOUT
+    last_error = "Overpass request failed"
+    retry_after = None
+
+    for attempt in range(MAX_RETRIES + 1):
+        for offset in range(len(OVERPASS_URLS)):
+            index = (_preferred_mirror + offset) % len(OVERPASS_URLS)
+            url = OVERPASS_URLS[index]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None, "Overpass request timed out"
+            try:
+                res = session.post(url, data={"data": query}, stream=stream,
+                                   timeout=(CONNECT_TIMEOUT, min(READ_TIMEOUT, remaining)))
+            except requests.exceptions.Timeout:
+                last_error = "Overpass request timed out"
+                continue
+            except requests.exceptions.RequestException as e:
+                last_error = f"Overpass request failed: {e}"
+                continue
+
+            if res.status_code in RETRY_STATUSES:
+                last_error = f"Overpass request failed: {res.status_code} from {url}"
+                retry_after = res.headers.get("Retry-After")
+                res.close()
+                continue
+            try:
+                res.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                # Bad query or similar, another mirror won't answer differently
+                res.close()
+                return None, f"Overpass request failed: {e}"
+            _preferred_mirror = index
+            return res, None
+
+        if attempt < MAX_RETRIES:
+            delay = min(_backoff(attempt, retry_after), deadline - time.monotonic())
+            if delay > 0:
+                time.sleep(delay)
+            retry_after = None
+
+    return None, last_error
+
+
+def keep_element(element: dict) -> bool:
     """
+    Elements usable as suggestions: no relations (they produce hundreds of thousands of entries),
+    no relation members that sneak in (ref/role objects) and only real POIs that have a name.
+    """
+    return (element.get("type") != "relation"
+            and not ("ref" in element and "role" in element)
+            and bool(element.get("tags", {}).get("name")))
+
+
+def project_element(element: dict) -> dict:
+    """
+    Drop the node list of ways, only the center is used.
+    """
+    element.pop("nodes", None)
+    return element
+
+
+def _parse_streamed(res, max_elements: int = None) -> dict:
+    """
+    Parse the "elements" array of a streamed Overpass response element by element, keeping
+    only the usable ones, so memory follows the kept elements instead of the raw body.
+    Reading stops once max_elements were kept.
+    """
+    parser = JSONArrayItemStream("elements")
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    elements = []
     try:
-        res = requests.get(OVERPASS_URL, params={"data": query}, headers=UA, timeout=300)
-        res.raise_for_status()
-    except requests.exceptions.Timeout:
-        return {"error": "Overpass request timed out"}
-    except requests.exceptions.RequestException as e:
+        for chunk in res.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            for element in parser.feed(decoder.decode(chunk)):
+                if keep_element(element):
+                    elements.append(project_element(element))
+                    if max_elements and len(elements) >= max_elements:
+                        return {"elements": elements, "truncated": True}
+        parser.feed(decoder.decode(b"", final=True))
+    except (requests.exceptions.RequestException, UnicodeDecodeError) as e:
         return {"error": f"Overpass request failed: {e}"}
+    finally:
+        res.close()
 
-    try:
-        return res.json()
-    except ValueError:
-        return {"error": "Failed to parse JSON from Overpass response"}
\ No newline at end of file
+    if not parser.done:
+        return {"error": "Failed to parse JSON from Overpass response"}
+    results = {"elements": elements}
+    # Overpass reports runtime errors (e.g. a query timeout) in a remark after the elements
+    remark = re.search(r'"remark"\s*:\s*("(?:[^"\\]|\\.)*")', parser.tail)
+    if remark:
+        results["remark"] = json.loads(remark.group(1))
+    return results
+
+
+def fetch_overpass_results(query: str, cache_key: str = None, max_elements: int = OVERPASS_MAX_ELEMENTS) -> dict:
+    """
+    Send a query to Overpass API and return the JSON result.
+    Handles request errors and timeouts.
+    When a cache_key is given (see overpass_cache.normalize_request), a cached
+    result is returned without touching the network and successful results are stored.
+    In streaming mode (OVERPASS_STREAM_PARSE) only the elements passing keep_element are
+    returned, at most max_elements of them (None = all).
+    """
+    if cache_key:
+        cached = overpass_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    res, error = request_overpass(query, stream=OVERPASS_STREAM_PARSE)
+    if error:
+        return {"error": error}
+
+    if OVERPASS_STREAM_PARSE:
+        results = _parse_streamed(res, max_elements)
+    else:
+        try:
+            results = res.json()
+        except ValueError:
+            return {"error": "Failed to parse JSON from Overpass response"}
+
+    # Only complete answers are cached, never errors or remarks about a timed out query
+    if cache_key and "elements" in results and not results.get("remark"):
+        overpass_cache.set(cache_key, results)
+    return results
+
+
+def submit_fetch(fn, *args, **kwargs) -> Future:
+    """
+    Run an Overpass fetch (e.g. fetch_overpass_results) on the fetch pool and return its future,
+    so the caller can do independent work, like reading the database, while waiting on the network.
+    """
+    return _fetch_pool.submit(fn, *args, **kwargs)
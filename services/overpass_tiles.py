@@ -0,0 +1,167 @@
+import hashlib
+import json
+import math
+import os
+
+from services.cache import SQLiteCache
+from services.geo import haversine_m, element_lat_lon
+from services.overpass_cache import normalize_filters
+from services.overpass_service import fetch_overpass_results
+
+# Opt-in: "tiles" fetches searches as fixed slippy-map tiles instead of one `around` query
+OVERPASS_FETCH_MODE = os.getenv("OVERPASS_FETCH_MODE", "query")
+
+# Zoom 14 tiles are ~2.4 km wide at the equator (~1.5 km at 50° latitude)
+TILE_ZOOM = int(os.getenv("OVERPASS_TILE_ZOOM", "14"))
+OVERPASS_TILE_TTL = int(os.getenv("OVERPASS_TILE_TTL", 7 * 24 * 3600))
+OVERPASS_TILE_MAX_BYTES = int(os.getenv("OVERPASS_TILE_MAX_BYTES", 500 * 1024 * 1024))
+
+# Upper bound of tiles fetched in one request, bigger searches are split into several requests
+MAX_TILES_PER_QUERY = 16
+# Upper bound of tiles covered by one search (at most 3 bbox requests at the default), larger
+# circles use the regular `around` query instead of dozens of unlimited bbox queries on one fetch thread
+OVERPASS_TILE_MAX_COUNT = int(os.getenv("OVERPASS_TILE_MAX_COUNT", "48"))
+
+tile_cache = SQLiteCache("overpass_tiles", ttl=OVERPASS_TILE_TTL, max_bytes=OVERPASS_TILE_MAX_BYTES)
+
+
+def tiled_mode_enabled() -> bool:
+    return OVERPASS_FETCH_MODE == "tiles"
+
+
+def lat_lon_to_tile(lat: float, lon: float, zoom: int = TILE_ZOOM):
+    """
+    Slippy map tile (x, y) that contains the point.
+    """
+    n = 2 ** zoom
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bbox(x: int, y: int, zoom: int = TILE_ZOOM):
+    """
+    Bounding box of a tile as (south, west, north, east).
+    """
+    n = 2 ** zoom
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return south, west, north, east
+
+
+def tiles_within_limit(lat: float, lon: float, radius: float, zoom: int = TILE_ZOOM) -> bool:
+    """
+    Whether the circle is covered by at most OVERPASS_TILE_MAX_COUNT tiles, so the search can be tiled.
+    """
+    return len(tiles_for_circle(float(lat), float(lon), float(radius), zoom)) <= OVERPASS_TILE_MAX_COUNT
+
+
+def tiles_for_circle(lat: float, lon: float, radius: float, zoom: int = TILE_ZOOM):
+    """
+    All tiles that intersect the circle of `radius` metres around lat/lon.
+    """
+    d_lat = radius / 111320.0
+    d_lon = radius / (111320.0 * max(math.cos(math.radians(lat)), 0.01))
+    x_min, y_min = lat_lon_to_tile(lat + d_lat, lon - d_lon, zoom)
+    x_max, y_max = lat_lon_to_tile(lat - d_lat, lon + d_lon, zoom)
+
+    tiles = []
+    for x in range(x_min, x_max + 1):
+        for y in range(y_min, y_max + 1):
+            south, west, north, east = tile_bbox(x, y, zoom)
+            # closest point of the tile to the centre
+            closest_lat = min(max(lat, south), north)
+            closest_lon = min(max(lon, west), east)
+            if haversine_m(lat, lon, closest_lat, closest_lon) <= radius:
+                tiles.append((x, y))
+    return tiles
+
+
+def _tile_key(category_key: str, x: int, y: int, zoom: int) -> str:
+    return f"{category_key}:{zoom}:{x}:{y}"
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _fetch_tiles(build_query, tiles, zoom):
+    """
+    Fetch the given tiles with one bbox query over their union and split the
+    elements back into tiles. Returns ({(x, y): [elements]}, error message or None).
+    """
+    boxes = [tile_bbox(x, y, zoom) for x, y in tiles]
+    union = (min(b[0] for b in boxes), min(b[1] for b in boxes),
+             max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+    # Stored tiles must be complete, no limit on the kept elements
+    results = fetch_overpass_results(build_query(None, None, None, bbox=union), max_elements=None)
+    if "elements" not in results or results.get("remark"):
+        return None, results.get("error") or results.get("remark") or "No elements returned"
+
+    by_tile = {tile: [] for tile in tiles}
+    for el in results["elements"]:
+        el_lat, el_lon = element_lat_lon(el)
+        if el_lat is None or el_lon is None:
+            continue
+        el.pop("nodes", None)
+        tile = lat_lon_to_tile(el_lat, el_lon, zoom)
+        if tile in by_tile:  # elements of neighbouring tiles are already cached
+            by_tile[tile].append(el)
+    return by_tile, None
+
+
+def fetch_overpass_tiles(build_query, category: str, filters: dict, lat, lon, radius) -> dict:
+    """
+    Tiled alternative to fetch_overpass_results for a suggestions search.
+
+    The circle is covered by fixed tiles stored per category + filters. Only the tiles
+    that are not cached yet are fetched from Overpass (as bbox queries built with
+    build_query(None, None, None, bbox=...)), then the circle is cut out of the merged tiles.
+
+    Returns:
+        dict: {"elements": [...]} like an Overpass response, or {"error": ...}.
+    """
+    lat, lon, radius = float(lat), float(lon), float(radius)
+    zoom = TILE_ZOOM
+    category_key = hashlib.sha256(
+        json.dumps({"category": category, "filters": normalize_filters(filters)}, sort_keys=True).encode()
+    ).hexdigest()[:16]
+
+    tiles = tiles_for_circle(lat, lon, radius, zoom)
+    if len(tiles) > OVERPASS_TILE_MAX_COUNT:
+        return {"error": f"Search area covers {len(tiles)} tiles, more than {OVERPASS_TILE_MAX_COUNT}"}
+    tile_elements = {}
+    missing = []
+    for x, y in tiles:
+        cached = tile_cache.get(_tile_key(category_key, x, y, zoom))
+        if cached is None:
+            missing.append((x, y))
+        else:
+            tile_elements[(x, y)] = cached
+
+    for chunk in _chunks(missing, MAX_TILES_PER_QUERY):
+        fetched, error = _fetch_tiles(build_query, chunk, zoom)
+        if error:
+            return {"error": error}
+        for (x, y), elements in fetched.items():
+            tile_cache.set(_tile_key(category_key, x, y, zoom), elements)
+            tile_elements[(x, y)] = elements
+
+    # Cut the circle out of the merged tiles
+    seen = set()
+    elements = []
+    for tile in tiles:
+        for el in tile_elements.get(tile, []):
+            el_id = (el.get("type"), el.get("id"))
+            if el_id in seen:
+                continue
+            el_lat, el_lon = element_lat_lon(el)
+            if haversine_m(lat, lon, el_lat, el_lon) <= radius:
+                seen.add(el_id)
+                elements.append(el)
+    return {"elements": elements}
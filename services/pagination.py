@@ -0,0 +1,49 @@
+import base64
+import os
+
+# Largest page a client can ask for with ?limit=
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+
+def encode_cursor(key) -> str:
+    """
+    Opaque cursor of the next page: the sort key of the last row sent.
+    """
+    return base64.urlsafe_b64encode(str(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def parse_page_args(args, allowed_fields):
+    """
+    Read ?fields=, ?cursor= and ?limit= of a list endpoint.
+
+    Returns (fields, after, limit): the requested columns (all of allowed_fields when
+    omitted), the sort key to continue after (None for the first page) and the page
+    size (None without ?limit= and ?cursor=, i.e. the whole list).
+    Raises ValueError on unknown fields, a malformed cursor or limit.
+    """
+    fields = list(allowed_fields)
+    if args.get("fields"):
+        fields = [f.strip() for f in args["fields"].split(",") if f.strip()]
+        unknown = [f for f in fields if f not in allowed_fields]
+        if unknown or not fields:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed_fields)}")
+
+    after = decode_cursor(args["cursor"]) if args.get("cursor") else None
+
+    limit = None
+    if args.get("limit") or after is not None:
+        try:
+            limit = int(args.get("limit", MAX_PAGE_SIZE))
+        except ValueError:
+            raise ValueError("Invalid limit")
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return fields, after, limit
@@ -0,0 +1,135 @@
+import math
+import os
+
+from services.geo import haversine_m
+
+# How many elements are forwarded to get_selection_via_openai per category.
+# Override with e.g. RANKING_TOP_K_EATDRINK=60, read once at import
+DEFAULT_TOP_K = 40
+DEFAULT_TOP_K_BY_CATEGORY = {
+    "explore": 40,
+    "stays": 30,
+    "eatDrink": 40,
+    "essentials": 25,
+    "gettingAround": 25,
+}
+
+
+def _top_k_setting(category: str, default: int) -> int:
+    name = f"RANKING_TOP_K_{category.upper()}"
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        top_k = int(value)
+    except ValueError:
+        top_k = 0
+    if top_k < 1:
+        raise ValueError(f"{name} must be a positive integer, got {value!r}")
+    return top_k
+
+
+TOP_K = {category: _top_k_setting(category, default) for category, default in DEFAULT_TOP_K_BY_CATEGORY.items()}
+
+# Tags the model needs to pick and describe a place, everything else is dropped from the prompt
+KEPT_TAGS = (
+    "name", "name:en", "amenity", "tourism", "leisure", "natural", "historic", "heritage",
+    "shop", "cuisine", "diet:vegetarian", "diet:vegan", "stars", "route", "railway", "highway",
+    "opening_hours", "website", "wikidata", "wikipedia", "description",
+    "addr:street", "addr:housenumber", "addr:postcode", "addr:city",
+    "wheelchair", "dog", "outdoor_seating", "internet_access", "fee",
+)
+
+# Tags of the stays style answers, to reward elements that match the requested style
+STAY_STYLE_TAGS = {
+    "Camping": ("tourism", ("camp_site", "caravan_site")),
+    "Hostel": ("tourism", ("hostel",)),
+    "B&B": ("tourism", ("guest_house", "bed_and_breakfast")),
+    "All-inclusive": ("tourism", ("resort",)),
+    "Budget Hotel": ("stars", ("0", "1", "2")),
+    "Mid-range Hotel": ("stars", ("3", "4")),
+    "Luxury Hotel": ("stars", ("4", "5")),
+}
+
+
+def top_k_for(category: str) -> int:
+    return TOP_K.get(category, DEFAULT_TOP_K)
+
+
+def _as_list(value):
+    if not value:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [str(v) for v in value]
+    return [str(value)]
+
+
+def _filter_match(tags: dict, user_request: dict) -> float:
+    """
+    Bonus for elements whose tags match the cuisine / style / type answers.
+    """
+    score = 0.0
+    cuisine = user_request.get("cuisine")
+    if cuisine and isinstance(cuisine, str):
+        if cuisine.strip().lower() in tags.get("cuisine", "").lower():
+            score += 2
+    for style in _as_list(user_request.get("style")):
+        tag, values = STAY_STYLE_TAGS.get(style, (None, ()))
+        if tag and tags.get(tag) in values:
+            score += 2
+            break
+    for answer in _as_list(user_request.get("type")):
+        if not answer.strip():  # blank answer, nothing to match
+            continue
+        word = answer.lower().split()[0].rstrip("s")  # "Train stations" -> "train"
+        if any(word in str(value).lower() for value in tags.values()):
+            score += 1
+            break
+    return score
+
+
+def score_element(element: dict, user_request: dict, lat: float, lon: float, radius: float) -> float:
+    """
+    Deterministic relevance score: tag richness, wikidata/wikipedia presence,
+    distance from the search point and match against the category filters.
+    """
+    tags = element.get("tags", {})
+    score = math.log1p(len(tags))
+    if "wikidata" in tags:
+        score += 3
+    if "wikipedia" in tags:
+        score += 2
+    if "website" in tags:
+        score += 0.5
+    if "opening_hours" in tags:
+        score += 0.5
+    if radius:
+        distance = haversine_m(lat, lon, element["lat"], element["lon"])
+        score += 2 * max(0.0, 1 - distance / radius)
+    return score + _filter_match(tags, user_request)
+
+
+def compact_element(element: dict) -> dict:
+    """
+    Projection of an element with only the fields the model needs.
+    """
+    tags = element.get("tags", {})
+    return {
+        "type": element.get("type"),
+        "id": element.get("id"),
+        "lat": element["lat"],
+        "lon": element["lon"],
+        "tags": {k: tags[k] for k in KEPT_TAGS if k in tags},
+    }
+
+
+def rank_elements(elements: list, user_request: dict, lat: float, lon: float, radius: float) -> list:
+    """
+    Score the filtered Overpass elements locally and return the compacted top K
+    of the request's category, best first. Elements must already carry lat/lon.
+    """
+    top_k = top_k_for(user_request.get("category"))
+    scored = [(score_element(el, user_request, lat, lon, radius), i, el) for i, el in enumerate(elements)]
+    # index as tie breaker keeps the order stable between identical requests
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [compact_element(el) for _, _, el in scored[:top_k]]
@@ -0,0 +1,103 @@
+import math
+import re
+from difflib import SequenceMatcher
+
+from services.geo import haversine_m
+
+# Per suggestions category: (radius in metres, whether the names must be similar too).
+# Big places (parks, museums) are stored as node or way centre far apart, so the radius
+# grows with the typical size of the places and a similar name is required.
+DUPLICATE_RULES = {
+    "explore": (150, True),
+    "stays": (75, True),
+    "eatDrink": (40, True),
+    "essentials": (30, True),
+    "gettingAround": (30, True),
+}
+DEFAULT_DUPLICATE_RULE = (50, True)
+# Anything this close is the same place, whatever its name
+SAME_SPOT_M = 5
+NAME_SIMILARITY = 0.85
+
+
+def normalize_name(name) -> str:
+    return re.sub(r"[^\w]+", " ", str(name or "")).casefold().strip()
+
+
+def similar_names(a: str, b: str) -> bool:
+    """
+    Fuzzy comparison of two normalized names ("Café Nord" vs "Cafe Nord Berlin").
+    """
+    if not a or not b:
+        return False
+    if a == b or a in b or b in a:
+        return True
+    return SequenceMatcher(None, a, b).ratio() >= NAME_SIMILARITY
+
+
+class SpatialHash:
+    """
+    Grid bucket index of points for "is there a point within N metres" lookups.
+
+    Points are projected around a reference latitude and stored in square cells of
+    `cell_size` metres, so a lookup with a radius up to cell_size only looks at the
+    3x3 cells around the query point instead of every point.
+    """
+
+    def __init__(self, cell_size: float, ref_lat: float = 0.0):
+        self.cell_size = cell_size
+        self._m_per_deg_lat = 111320.0
+        self._m_per_deg_lon = 111320.0 * max(math.cos(math.radians(ref_lat)), 0.01)
+        self._cells = {}
+
+    def _cell(self, lat: float, lon: float):
+        return (int(math.floor(lat * self._m_per_deg_lat / self.cell_size)),
+                int(math.floor(lon * self._m_per_deg_lon / self.cell_size)))
+
+    def add(self, lat: float, lon: float, name=None):
+        self._cells.setdefault(self._cell(lat, lon), []).append((lat, lon, normalize_name(name)))
+
+    def nearby(self, lat: float, lon: float, radius: float):
+        """
+        Yield (lat, lon, normalized name, distance) of the points within radius metres.
+        """
+        reach = max(1, int(math.ceil(radius / self.cell_size)))
+        cell_lat, cell_lon = self._cell(lat, lon)
+        for d_lat in range(-reach, reach + 1):
+            for d_lon in range(-reach, reach + 1):
+                for point in self._cells.get((cell_lat + d_lat, cell_lon + d_lon), ()):
+                    distance = haversine_m(lat, lon, point[0], point[1])
+                    if distance <= radius:
+                        yield point[0], point[1], point[2], distance
+
+    def has_near(self, lat: float, lon: float, radius: float, name=None) -> bool:
+        """
+        True if a point lies within radius metres, and when name is given, has a similar name.
+        """
+        wanted = normalize_name(name) if name is not None else None
+        for _, _, point_name, _ in self.nearby(lat, lon, radius):
+            if wanted is None or similar_names(wanted, point_name):
+                return True
+        return False
+
+
+def marker_index(markers: list, category: str = None, ref_lat: float = 0.0):
+    """
+    Build the duplicate checker of a suggestions search from the trip's markers
+    ({"name", "lat", "lon"} dicts). ref_lat should be the latitude of the search,
+    where the candidates are.
+
+    Returns:
+        function: is_duplicate(lat, lon, name) -> bool, using the rule of the category.
+    """
+    radius, match_name = DUPLICATE_RULES.get(category, DEFAULT_DUPLICATE_RULE)
+    index = SpatialHash(cell_size=max(radius, SAME_SPOT_M), ref_lat=ref_lat)
+    for marker in markers:
+        index.add(marker["lat"], marker["lon"], marker.get("name"))
+
+    def is_duplicate(lat, lon, name=None):
+        if index.has_near(lat, lon, SAME_SPOT_M):
+            return True
+        return index.has_near(lat, lon, radius, name if match_name else None)
+
+    return is_duplicate
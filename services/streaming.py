@@ -0,0 +1,108 @@
+import json
+import re
+
+
+def sse_event(event: str, data) -> str:
+    """
+    Format one Server-Sent Event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def strip_code_fences(text: str) -> str:
+    return re.sub(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$", "", text.strip())
+
+
+class JSONArrayItemStream:
+    """
+    Incrementally extracts the items of the array under `key` from a JSON
+    document that arrives in chunks, e.g. {"destinations": [{...}, {...}]}.
+
+    feed() returns the items that became complete with the new chunk and drops the
+    text they were parsed from, so memory stays bounded by the largest single item.
+    Items are parsed with the C json decoder; an item that doesn't parse yet is
+    retried when more text arrives. Items must be objects, arrays or strings (a number
+    at the end of a chunk could still continue in the next one).
+    Text after the closing bracket is collected in `tail`.
+    """
+
+    _separators = re.compile(r"[\s,]*")
+
+    def __init__(self, key: str):
+        self._start_pattern = re.compile(r'"' + re.escape(key) + r'"\s*:\s*\[')
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._in_array = False
+        self.done = False
+        self.tail = ""
+
+    def feed(self, chunk: str) -> list:
+        if self.done:
+            self.tail += chunk
+            return []
+        self._buffer += chunk
+        if not self._in_array:
+            match = self._start_pattern.search(self._buffer)
+            if not match:
+                return []
+            self._buffer = self._buffer[match.end():]
+            self._in_array = True
+
+        items = []
+        buffer = self._buffer
+        pos = 0
+        while True:
+            pos = self._separators.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == "]":
+                self.done = True
+                self.tail = buffer[pos + 1:]
+                pos = len(buffer)
+                break
+            try:
+                item, pos_after = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # incomplete item, wait for the next chunk
+            items.append(item)
+            pos = pos_after
+        self._buffer = buffer[pos:]
+        return items
+
+
+def stream_json_items(deltas, key: str, item_event: str, on_complete=None, finalize=None):
+    """
+    Turn the text deltas of a streamed completion into Server-Sent Events.
+
+    Every finished item of the array under `key` is sent as an `item_event` event,
+    followed by a "done" event carrying the full validated JSON (passed to on_complete
+    first, e.g. to cache it) or an "error" event.
+    finalize, if given, maps the validated JSON to what is sent with "done" and cached.
+    """
+    parser = JSONArrayItemStream(key)
+    parts = []
+    try:
+        for delta in deltas:
+            parts.append(delta)
+            for item in parser.feed(delta):
+                yield sse_event(item_event, item)
+    except Exception as e:
+        print("Error reaching OpenAI:", str(e))
+        yield sse_event("error", {"error": "openai_unreachable"})
+        return
+
+    text = strip_code_fences("".join(parts))
+    try:
+        result = json.loads(text)
+    except json.JSONDecodeError:
+        yield sse_event("error", {"error": "Invalid JSON from OpenAI", "raw": text})
+        return
+    if not isinstance(result, dict) or not isinstance(result.get(key), list):
+        yield sse_event("error", {"error": "Invalid JSON from OpenAI", "raw": text})
+        return
+
+    if finalize:
+        result = finalize(result)
+    if on_complete:
+        on_complete(result)
+    yield sse_event("done", result)
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+
+from services.cache import SQLiteCache
+from services.geo import geohash, geohash_center, haversine_m
+
+# Coordinates are compared at ~10 m precision, nudging a marker on the map doesn't invalidate the tips
+MARKER_PRECISION = 4
+
+TIPS_CACHE_TTL = int(os.getenv("TIPS_CACHE_TTL", 90 * 24 * 3600))
+TIPS_CACHE_MAX_ENTRIES = int(os.getenv("TIPS_CACHE_MAX_ENTRIES", "20000"))
+
+# One entry per trip: {"markers_hash": ..., "tips": ...}, replaced when the marker set changes
+tips_cache = SQLiteCache("tips", ttl=TIPS_CACHE_TTL, max_entries=TIPS_CACHE_MAX_ENTRIES)
+
+# General tips of a region, shared by every trip whose markers are centred in the same geohash cell
+TIPS_REGION_PRECISION = int(os.getenv("TIPS_REGION_PRECISION", "4"))
+# Trips with markers further than this from their centroid (road trips...) get their tips generated as a whole
+TIPS_REGION_MAX_SPREAD_M = float(os.getenv("TIPS_REGION_MAX_SPREAD_M", "50000"))
+REGION_TIPS_TTL = int(os.getenv("REGION_TIPS_TTL", 180 * 24 * 3600))
+REGION_TIPS_MAX_ENTRIES = int(os.getenv("REGION_TIPS_MAX_ENTRIES", "50000"))
+
+region_tips_cache = SQLiteCache("region_tips", ttl=REGION_TIPS_TTL, max_entries=REGION_TIPS_MAX_ENTRIES)
+
+
+def markers_hash(markers: list) -> str:
+    """
+    Hash of a trip's marker set (names + rounded coordinates), independent of the marker order.
+    It changes when places are added, moved or removed, which is when the tips have to be regenerated.
+    """
+    canonical = sorted(
+        ((m.get("name") or "").strip().lower(), round(float(m["lat"]), MARKER_PRECISION),
+         round(float(m["lon"]), MARKER_PRECISION))
+        for m in markers
+    )
+    return hashlib.sha256(json.dumps(canonical).encode()).hexdigest()
+
+
+def get_cached_tips(trip_id: str, marker_hash: str):
+    """
+    Return the stored tips of the trip if they were generated for this marker set, else None.
+    """
+    entry = tips_cache.get(trip_id)
+    if entry is None or entry.get("markers_hash") != marker_hash:
+        return None
+    return entry["tips"]
+
+
+def store_tips(trip_id: str, marker_hash: str, tips):
+    tips_cache.set(trip_id, {"markers_hash": marker_hash, "tips": tips})
+
+
+def forget_tips(trip_id: str):
+    tips_cache.delete(trip_id)
+
+
+def trip_region(markers: list):
+    """
+    Region of a trip: the geohash cell of its markers' centroid and the centre of that cell
+    (so every trip in the cell describes the region the same way), as {"cell", "lat", "lon"}.
+    None when the trip has no markers or they are spread over more than one region.
+    """
+    if not markers:
+        return None
+    lat = sum(float(m["lat"]) for m in markers) / len(markers)
+    lon = sum(float(m["lon"]) for m in markers) / len(markers)
+    if any(haversine_m(lat, lon, float(m["lat"]), float(m["lon"])) > TIPS_REGION_MAX_SPREAD_M for m in markers):
+        return None
+    cell = geohash(lat, lon, TIPS_REGION_PRECISION)
+    cell_lat, cell_lon = geohash_center(cell)
+    return {"cell": cell, "lat": round(cell_lat, 4), "lon": round(cell_lon, 4)}
+
+
+def combine_tips(region_tips, trip_tips: dict) -> dict:
+    """
+    The general tips of the region followed by the trip specific ones.
+    """
+    if not region_tips:
+        return trip_tips
+    return {**trip_tips, "tips": list(region_tips) + list(trip_tips.get("tips", []))}
@@ -0,0 +1,176 @@
+import re
+
+import pytest
+
+from services.overpass_compiler import compile_query
+from services.overpass_queries import (
+    ESSENTIALS,
+    query_eat_drink,
+    query_essentials,
+    query_getting_around,
+    query_places_explore_indoor,
+    query_places_explore_outdoor,
+    query_stays,
+)
+
+AREA = "(around:300,1,2)"
+HEADER = "[out:json][timeout:180];"
+STATEMENT = re.compile(r'^(node|way|rel|nw|wr|nr|nwr)(\["[^"]+"(?:(?:=|~)"(?:[^"\\]|\\.)*"(?:,i)?)?\])+$')
+
+
+def around(*statements, limit):
+    return f"{HEADER}({''.join(s + AREA + ';' for s in statements)});out center {limit};"
+
+
+BUILT_IN_QUERIES = {
+    "explore outdoor": (
+        query_places_explore_outdoor(1, 2, 300),
+        around('nwr["natural"~"water|lake|spring|forest"]["name"]',
+               'nwr["leisure"~"park|garden|nature_reserve"]["name"]',
+               'nwr["tourism"~"attraction|viewpoint|picnic_site|theme_park"]["name"]',
+               'way["highway"="path"]["foot"="designated"]["name"]',
+               'rel["route"="hiking"]["name"]', limit=200),
+    ),
+    "explore indoor": (
+        query_places_explore_indoor(1, 2, 300),
+        around('nwr["tourism"~"museum|theatre"]["name"]',
+               'nwr["amenity"="library"]["tourism"="attraction"]["name"]',
+               'nwr["amenity"="library"]["heritage"]["name"]',
+               'nwr["building"="church"]["historic"]',
+               'nwr["historic"]["name"]', limit=200),
+    ),
+    "stays Camping": (
+        query_stays(1, 2, 300, ["Camping"]),
+        around('nwr["tourism"~"^(camp_site|caravan_site)$"]', limit=100),
+    ),
+    "stays Hostel": (
+        query_stays(1, 2, 300, ["Hostel"]),
+        around('nwr["tourism"="hostel"]', limit=100),
+    ),
+    "stays Budget Hotel": (
+        query_stays(1, 2, 300, ["Budget Hotel"]),
+        around('nwr["tourism"="hotel"]["stars"~"^[0-2]$"]', limit=100),
+    ),
+    "stays Mid-range Hotel": (
+        query_stays(1, 2, 300, ["Mid-range Hotel"]),
+        around('nwr["tourism"="hotel"]["stars"~"^(3|4)$"]', limit=100),
+    ),
+    "stays Luxury Hotel": (
+        query_stays(1, 2, 300, ["Luxury Hotel"]),
+        around('nwr["tourism"="hotel"]["stars"~"^(4|5)$"]', 'nwr["tourism"="resort"]', limit=100),
+    ),
+    "stays B&B": (
+        query_stays(1, 2, 300, ["B&B"]),
+        around('nwr["tourism"~"^(guest_house|bed_and_breakfast)$"]', limit=100),
+    ),
+    "stays All-inclusive": (
+        query_stays(1, 2, 300, ["All-inclusive"]),
+        around('nwr["tourism"="resort"]', limit=100),
+    ),
+    "stays Mid-range + Luxury": (
+        query_stays(1, 2, 300, ["Mid-range Hotel", "Luxury Hotel"]),
+        around('nwr["tourism"="hotel"]["stars"~"^(3|4|5)$"]', 'nwr["tourism"="resort"]', limit=100),
+    ),
+    "eat & drink": (
+        query_eat_drink(1, 2, 300),
+        around('nwr["amenity"~"^(restaurant|cafe|bar|fast_food)$"]["cuisine"~".*",i]', limit=100),
+    ),
+    "eat & drink without cuisine": (
+        query_eat_drink(1, 2, 300, cuisine=""),
+        around('nwr["amenity"~"^(restaurant|cafe|bar|fast_food)$"]', limit=100),
+    ),
+    "essentials supermarket": (
+        query_essentials(1, 2, 300, "supermarket"),
+        around('nwr["shop"="supermarket"]["name"]', limit=100),
+    ),
+    "essentials pharmacy": (
+        query_essentials(1, 2, 300, "pharmacy"),
+        around('nwr["amenity"="pharmacy"]["name"]', limit=100),
+    ),
+    "essentials atm": (
+        query_essentials(1, 2, 300, "atm"),
+        around('nwr["amenity"="atm"]["name"]', limit=100),
+    ),
+    "essentials hospital": (
+        query_essentials(1, 2, 300, "hospital"),
+        around('nwr["amenity"="hospital"]["name"]', limit=100),
+    ),
+    "essentials other": (
+        query_essentials(1, 2, 300, "other"),
+        around('nwr["shop"~"^(convenience|general|kiosk|variety_store)$",i]["name"]',
+               'nwr["amenity"~"^(toilets|bank|post_office|bureau_de_change|clinic|fuel)$",i]["name"]', limit=100),
+    ),
+    "getting around Train stations": (
+        query_getting_around(1, 2, 300, ["Train stations"]),
+        around('nwr["railway"="station"]["name"]', limit=100),
+    ),
+    "getting around Bus stops": (
+        query_getting_around(1, 2, 300, ["Bus stops"]),
+        around('nwr["highway"="bus_stop"]["name"]', limit=100),
+    ),
+    "getting around Parking spots": (
+        query_getting_around(1, 2, 300, ["Parking spots"]),
+        around('nwr["amenity"="parking"]["name"]', limit=100),
+    ),
+    "getting around Bike rentals": (
+        query_getting_around(1, 2, 300, ["Bike rentals"]),
+        around('nwr["amenity"="bicycle_rental"]["name"]', limit=100),
+    ),
+    "getting around Charging Stations": (
+        query_getting_around(1, 2, 300, ["Charging Stations"]),
+        around('nwr["amenity"="charging_station"]["name"]', limit=100),
+    ),
+    "getting around Car rental": (
+        query_getting_around(1, 2, 300, ["Car rental"]),
+        around('nwr["amenity"="car_rental"]["name"]', limit=100),
+    ),
+}
+
+
+def statements(query):
+    body = query[query.index(";(") + 2:query.rindex(");out")]
+    return [s for s in body.split(";") if s]
+
+
+@pytest.mark.parametrize("name", BUILT_IN_QUERIES)
+def test_built_in_query_text(name):
+    query, expected = BUILT_IN_QUERIES[name]
+    assert query == expected
+
+
+def test_every_essentials_type_is_covered():
+    assert {f"essentials {t}" for t in ESSENTIALS} <= set(BUILT_IN_QUERIES)
+
+
+@pytest.mark.parametrize("name", BUILT_IN_QUERIES)
+def test_built_in_statements_are_valid_overpass(name):
+    query, _ = BUILT_IN_QUERIES[name]
+    for statement in statements(query):
+        assert STATEMENT.match(statement.removesuffix(AREA)), statement
+
+
+@pytest.mark.parametrize("types, expected", [
+    ("n", "node"), ("w", "way"), ("r", "rel"),
+    ("nw", "nw"), ("wr", "wr"), ("nr", "nr"), ("rn", "nr"), ("nwr", "nwr"),
+])
+def test_element_types(types, expected):
+    query = compile_query([(types, (("amenity", "=", "cafe"),))], 1, 2, 300, limit=10)
+    assert statements(query) == [f'{expected}["amenity"="cafe"]{AREA}']
+
+
+def test_single_types_with_the_same_filters_merge():
+    selectors = [("n", (("amenity", "=", "cafe"),)), ("w", (("amenity", "=", "cafe"),))]
+    assert statements(compile_query(selectors, 1, 2, 300, limit=10)) == [f'nw["amenity"="cafe"]{AREA}']
+
+
+def test_bbox_query_has_global_bbox_and_no_limit():
+    query = query_places_explore_outdoor(1, 2, 300, bbox=(1.5, 2.5, 3.5, 4.5))
+    assert query.startswith("[out:json][timeout:180][bbox:1.5,2.5,3.5,4.5];(")
+    assert query.endswith(");out center;")
+    assert 'way["highway"="path"]["foot"="designated"]["name"];' in query
+    assert "around" not in query
+
+
+def test_limit_scale_multiplies_the_out_limit():
+    assert query_stays(1, 2, 300, ["Hostel"], limit_scale=2.5).endswith("out center 250;")
+    assert query_places_explore_indoor(1, 2, 300, limit_scale=1.001).endswith("out center 201;")